@@ -0,0 +1,150 @@
+import asyncio
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
+
+from .data_store import DataStore
+from .library import Library
+from .resilience import SingleFlight
+from .steam_api import SteamAPI, SteamAPIError
+
+
+def count_unlocked(stats: Optional[Mapping[str, Any]]) -> int:
+    achievements = stats.get("achievements", []) if stats else []
+    return sum(1 for ach in achievements if ach.get("achieved", 0) == 1 or ach.get("unlocktime"))
+
+
+def count_total(schema: Optional[Mapping[str, Any]]) -> int:
+    return len(schema.get("availableGameStats", {}).get("achievements", [])) if schema else 0
+
+
+class AchievementEngine:
+    """
+    Library-wide achievement totals backed by persistent per-(steam_id, appid) snapshots.
+
+    A snapshot stores the unlocked / total counts together with the game's playtime when it
+    was sampled. ``aggregate`` only reads the stored snapshots, so a command never waits on
+    Steam for them; ``refresh`` re-queries games without a snapshot or whose
+    ``playtime_forever`` changed since (you cannot unlock achievements without playing), at
+    most ``refresh_limit`` per call, most played first, with stats and schema fetched
+    concurrently under a shared ``concurrency`` limit. Games never played only need their
+    (store-cached) schema.
+    """
+
+    def __init__(
+        self,
+        steam_api: SteamAPI,
+        store: Optional[DataStore] = None,
+        logger=None,
+        concurrency: int = 4,
+        refresh_limit: int = 8,
+    ):
+        self.steam_api = steam_api
+        self.store = store
+        self.logger = logger
+        self.refresh_limit = max(1, int(refresh_limit))
+        self._semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+        # steam_id -> appid -> (playtime, unlocked, total)
+        self._snapshots: Dict[str, Dict[int, Tuple[int, int, int]]] = {}
+        self._loading = SingleFlight()
+        # steam ids with a refresh running, so repeated commands do not queue duplicate samples
+        self._refreshing: Set[str] = set()
+
+    async def _load(self, steam_id: str) -> Dict[int, Tuple[int, int, int]]:
+        snapshots = self._snapshots.get(steam_id)
+        if snapshots is not None:
+            return snapshots
+        snapshots = await self._loading.run(steam_id, lambda: self._read(steam_id))
+        return self._snapshots.setdefault(steam_id, snapshots)
+
+    async def _read(self, steam_id: str) -> Dict[int, Tuple[int, int, int]]:
+        if self.store is None:
+            return {}
+        try:
+            return await self.store.get_achievement_snapshots(steam_id)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"读取成就快照失败：{e}")
+            return {}
+
+    async def _sample(self, steam_id: str, appid: int, playtime: int) -> Tuple[int, int, int, int]:
+        async with self._semaphore:
+            if playtime > 0:
+                stats, schema = await asyncio.gather(
+                    self.steam_api.get_user_stats_for_game(steam_id, appid),
+                    self.steam_api.get_schema_for_game(appid),
+                )
+            else:
+                stats, schema = None, await self.steam_api.get_schema_for_game(appid)
+        return appid, playtime, count_unlocked(stats), count_total(schema)
+
+    async def record(self, steam_id: str, rows: List[Tuple[int, int, int, int]]):
+        """Store (appid, playtime, unlocked, total) rows, e.g. from a /steam成就 lookup."""
+        if not rows:
+            return
+        snapshots = await self._load(steam_id)
+        for appid, playtime, unlocked, total in rows:
+            snapshots[int(appid)] = (playtime, unlocked, total)
+        if self.store is not None:
+            try:
+                await self.store.put_achievement_snapshots(steam_id, rows)
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"写入成就快照失败：{e}")
+
+    def _stale(self, snapshots: Mapping[int, Tuple[int, int, int]], library: Library) -> List[Tuple[int, int]]:
+        """(appid, playtime) of games without an up-to-date snapshot, most played first."""
+        stale = []
+        for game in library.top():
+            appid = int(game["appid"])
+            playtime = int(game.get("playtime_forever", 0) or 0)
+            snapshot = snapshots.get(appid)
+            if snapshot is None or snapshot[0] != playtime:
+                stale.append((appid, playtime))
+        return stale
+
+    async def aggregate(self, steam_id: str, library: Library) -> Dict[str, int]:
+        """
+        Unlocked / total achievements over the whole library from the stored snapshots alone.
+        Games without an up-to-date snapshot are reported in ``pending``; see ``refresh``.
+        """
+        result = {"unlocked": 0, "total": 0, "games": len(library) if library else 0, "pending": 0}
+        if not library or not steam_id:
+            return result
+        snapshots = await self._load(steam_id)
+        pending = 0
+        for appid, playtime in zip(library.appids, library.playtimes):
+            snapshot = snapshots.get(appid)
+            if snapshot is None:
+                pending += 1
+                continue
+            if snapshot[0] != playtime:
+                pending += 1
+            result["unlocked"] += snapshot[1]
+            result["total"] += snapshot[2]
+        result["pending"] = pending
+        return result
+
+    async def refresh(self, steam_id: str, library: Library) -> int:
+        """
+        Re-sample up to ``refresh_limit`` stale games of the library; meant to run in the
+        background after ``aggregate`` reported pending games. Returns the number sampled.
+        """
+        if not library or not steam_id or steam_id in self._refreshing:
+            return 0
+        self._refreshing.add(steam_id)
+        try:
+            snapshots = await self._load(steam_id)
+            batch = self._stale(snapshots, library)[: self.refresh_limit]
+            if not batch:
+                return 0
+            outcomes = await asyncio.gather(
+                *(self._sample(steam_id, appid, playtime) for appid, playtime in batch),
+                return_exceptions=True,
+            )
+            rows = [row for row in outcomes if isinstance(row, tuple)]
+            errors = [e for e in outcomes if isinstance(e, Exception) and not isinstance(e, SteamAPIError)]
+            if errors and self.logger:
+                self.logger.warning(f"成就统计失败：{errors[0]}")
+            await self.record(steam_id, rows)
+            return len(rows)
+        finally:
+            self._refreshing.discard(steam_id)
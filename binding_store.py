@@ -0,0 +1,292 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+
+class BindingStore:
+    """
+    User -> Steam ID bindings and per-group membership, persisted in SQLite (WAL).
+
+    The bindings are served from memory (``users`` and ``groups`` are the live dictionaries);
+    changes go through ``bind`` / ``link`` and are written behind: row-level upserts are
+    collected and committed in one transaction ``flush_delay`` seconds after the first change,
+    in a worker thread, instead of rewriting the whole file on the event loop. Kept apart from
+    the DataStore cache database because bindings are user data and must never be dropped on a
+    cache schema change. The legacy ``steam_binding.json`` is imported once on first load.
+
+    Reverse indexes (user -> groups, steam_id -> users) are kept in step with every change,
+    so rebinding, unbinding and membership queries cost O(groups of that user) rather than
+    a scan over every group.
+    """
+
+    _TABLES = (
+        """
+        CREATE TABLE IF NOT EXISTS user_bindings (
+            user_id TEXT PRIMARY KEY,
+            steam_id TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS group_bindings (
+            group_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            steam_id TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (group_id, user_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """,
+    )
+
+    def __init__(self, db_path: Path, legacy_file: Optional[Path] = None, logger=None, flush_delay: float = 1.0):
+        self.db_path = Path(db_path)
+        self.legacy_file = Path(legacy_file) if legacy_file else None
+        self.logger = logger
+        self.flush_delay = max(0.0, float(flush_delay))
+        self.users: Dict[str, str] = {}
+        self.groups: Dict[str, Dict[str, str]] = {}
+        self._user_groups: Dict[str, Set[str]] = {}
+        self._steam_users: Dict[str, Set[str]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Rows changed since the last flush; None marks a deletion
+        self._pending_users: Dict[str, Optional[str]] = {}
+        self._pending_links: Dict[Tuple[str, str], Optional[str]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is not None:
+            return self._conn
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for ddl in self._TABLES:
+            conn.execute(ddl)
+        conn.commit()
+        self._conn = conn
+        return conn
+
+    def _read_legacy(self) -> Optional[Tuple[Dict[str, str], Dict[str, Dict[str, str]]]]:
+        if self.legacy_file is None or not self.legacy_file.exists():
+            return None
+        try:
+            with self.legacy_file.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"读取旧版绑定文件失败，本次跳过迁移：{e}")
+            return None
+        if not isinstance(data, dict):
+            return None
+        # Older versions stored a flat user -> steam_id dict
+        if "users" in data and "groups" in data:
+            return data.get("users") or {}, data.get("groups") or {}
+        return data, {}
+
+    def _migrate(self, conn: sqlite3.Connection) -> int:
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_migrated'").fetchone():
+            return 0
+        legacy = self._read_legacy()
+        if legacy is None:
+            return 0
+        users, groups = legacy
+        now = time.time()
+        user_rows = [(str(uid), str(sid), now) for uid, sid in users.items() if sid]
+        link_rows = [
+            (str(gid), str(uid), str(sid), now)
+            for gid, members in groups.items() if isinstance(members, dict)
+            for uid, sid in members.items() if sid
+        ]
+        # Rows already in the database are newer than the JSON file
+        conn.executemany("INSERT OR IGNORE INTO user_bindings VALUES (?, ?, ?)", user_rows)
+        conn.executemany("INSERT OR IGNORE INTO group_bindings VALUES (?, ?, ?, ?)", link_rows)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_migrated', ?)", (str(now),))
+        conn.commit()
+        try:
+            self.legacy_file.replace(self.legacy_file.with_name(self.legacy_file.name + ".migrated"))
+        except OSError:
+            pass
+        return len(user_rows)
+
+    def _load_sync(self) -> Tuple[Dict[str, str], Dict[str, Dict[str, str]], int]:
+        with self._lock:
+            conn = self._connect()
+            migrated = self._migrate(conn)
+            users = dict(conn.execute("SELECT user_id, steam_id FROM user_bindings").fetchall())
+            groups: Dict[str, Dict[str, str]] = {}
+            for group_id, user_id, steam_id in conn.execute("SELECT group_id, user_id, steam_id FROM group_bindings"):
+                groups.setdefault(group_id, {})[user_id] = steam_id
+        return users, groups, migrated
+
+    async def load(self):
+        users, groups, migrated = await asyncio.to_thread(self._load_sync)
+        # Changes made before loading finished win over the stored rows
+        for user_id, steam_id in users.items():
+            if user_id not in self.users:
+                self.users[user_id] = steam_id
+                self._steam_users.setdefault(steam_id, set()).add(user_id)
+        for group_id, members in groups.items():
+            group_map = self.groups.setdefault(group_id, {})
+            for user_id, steam_id in members.items():
+                if user_id not in group_map:
+                    group_map[user_id] = steam_id
+                    self._user_groups.setdefault(user_id, set()).add(group_id)
+        if migrated and self.logger:
+            self.logger.info(f"已从 {self.legacy_file.name} 迁移 {migrated} 个绑定到 {self.db_path.name}")
+
+    def get(self, user_id: str) -> Optional[str]:
+        return self.users.get(user_id)
+
+    def groups_of(self, user_id: str) -> Set[str]:
+        """Groups the user is linked to (a copy)."""
+        return set(self._user_groups.get(user_id, ()))
+
+    def users_of(self, steam_id: str) -> Set[str]:
+        """Users bound to steam_id (a copy)."""
+        return set(self._steam_users.get(steam_id, ()))
+
+    def _discard(self, index: Dict[str, Set[str]], key: str, value: str):
+        values = index.get(key)
+        if values is not None:
+            values.discard(value)
+            if not values:
+                del index[key]
+
+    def bind(self, user_id: str, steam_id: str) -> bool:
+        """Bind user_id to steam_id and carry the new id over to every group the user is in."""
+        previous = self.users.get(user_id)
+        if previous == steam_id:
+            return False
+        if previous is not None:
+            self._discard(self._steam_users, previous, user_id)
+        self.users[user_id] = steam_id
+        self._steam_users.setdefault(steam_id, set()).add(user_id)
+        self._pending_users[user_id] = steam_id
+        for group_id in self.groups_of(user_id):
+            self.link(group_id, user_id, steam_id)
+        self._schedule()
+        return True
+
+    def unbind(self, user_id: str) -> Optional[str]:
+        """Remove the user's binding and group links; returns the steam id it was bound to."""
+        for group_id in self.groups_of(user_id):
+            self.unlink(group_id, user_id)
+        steam_id = self.users.pop(user_id, None)
+        if steam_id is None:
+            return None
+        self._discard(self._steam_users, steam_id, user_id)
+        self._pending_users[user_id] = None
+        self._schedule()
+        return steam_id
+
+    def link(self, group_id: str, user_id: str, steam_id: str) -> bool:
+        """Record that user_id is bound as steam_id in group_id."""
+        group_map = self.groups.setdefault(group_id, {})
+        if group_map.get(user_id) == steam_id:
+            return False
+        group_map[user_id] = steam_id
+        self._user_groups.setdefault(user_id, set()).add(group_id)
+        self._pending_links[(group_id, user_id)] = steam_id
+        self._schedule()
+        return True
+
+    def unlink(self, group_id: str, user_id: str) -> bool:
+        group_map = self.groups.get(group_id)
+        if not group_map or user_id not in group_map:
+            return False
+        del group_map[user_id]
+        if not group_map:
+            del self.groups[group_id]
+        self._discard(self._user_groups, user_id, group_id)
+        self._pending_links[(group_id, user_id)] = None
+        self._schedule()
+        return True
+
+    def _schedule(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        while True:
+            await asyncio.sleep(self.flush_delay)
+            # Shielded: close() cancels the timer, never a write in progress
+            ok = await asyncio.shield(self.flush())
+            # Changes made while writing go out in another batch; a failed batch waits for
+            # the next change or close()
+            if not ok or not (self._pending_users or self._pending_links):
+                return
+
+    def _write(self, users: Dict[str, Optional[str]], links: Dict[Tuple[str, str], Optional[str]]):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.executemany(
+                    """
+                    INSERT INTO user_bindings (user_id, steam_id, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET steam_id = excluded.steam_id, updated_at = excluded.updated_at
+                    """,
+                    [(uid, sid, now) for uid, sid in users.items() if sid is not None],
+                )
+                conn.executemany(
+                    "DELETE FROM user_bindings WHERE user_id = ?",
+                    [(uid,) for uid, sid in users.items() if sid is None],
+                )
+                conn.executemany(
+                    """
+                    INSERT INTO group_bindings (group_id, user_id, steam_id, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(group_id, user_id) DO UPDATE SET steam_id = excluded.steam_id, updated_at = excluded.updated_at
+                    """,
+                    [(gid, uid, sid, now) for (gid, uid), sid in links.items() if sid is not None],
+                )
+                conn.executemany(
+                    "DELETE FROM group_bindings WHERE group_id = ? AND user_id = ?",
+                    [(gid, uid) for (gid, uid), sid in links.items() if sid is None],
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    async def flush(self) -> bool:
+        """Commit pending changes now (one transaction, off the event loop)."""
+        # Serialized so an older batch can never land after a newer one
+        async with self._flush_lock:
+            users, self._pending_users = self._pending_users, {}
+            links, self._pending_links = self._pending_links, {}
+            if not users and not links:
+                return True
+            try:
+                await asyncio.to_thread(self._write, users, links)
+            except Exception as e:
+                # Keep the batch for the next flush unless a newer change replaced it
+                for key, value in users.items():
+                    self._pending_users.setdefault(key, value)
+                for key, value in links.items():
+                    self._pending_links.setdefault(key, value)
+                if self.logger:
+                    self.logger.error(f"保存绑定失败：{e}")
+                return False
+            return True
+
+    async def close(self):
+        task, self._flush_task = self._flush_task, None
+        if task is not None and not task.done():
+            task.cancel()
+        await self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
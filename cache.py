@@ -0,0 +1,184 @@
+import sys
+import time
+from collections import OrderedDict
+from itertools import islice
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+# Number of items inspected when estimating the size of large containers
+_SIZE_SAMPLE = 32
+_SIZE_MAX_DEPTH = 4
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """
+    Rough, bounded estimate of the memory held by a cached value.
+    Large containers are sampled instead of walked completely, so a 5,000-game library costs
+    the same to measure as a 32-game one.
+    """
+    size = sys.getsizeof(value)
+    if _depth >= _SIZE_MAX_DEPTH:
+        return size
+    if isinstance(value, (dict, MappingProxyType)):
+        items = value.items()
+        count = len(value)
+        sample = list(islice(items, _SIZE_SAMPLE))
+        if sample:
+            sampled = sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in sample)
+            size += sampled * count // len(sample)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        count = len(value)
+        sample = list(islice(value, _SIZE_SAMPLE))
+        if sample:
+            sampled = sum(estimate_size(v, _depth + 1) for v in sample)
+            size += sampled * count // len(sample)
+    return size
+
+
+def freeze_record(record: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Read-only view of a record, safe to share between callers without copying."""
+    if isinstance(record, MappingProxyType):
+        return record
+    return MappingProxyType(dict(record))
+
+
+def freeze_records(records: Iterable[Mapping[str, Any]]) -> Tuple[Mapping[str, Any], ...]:
+    return tuple(freeze_record(r) for r in records)
+
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "expires_at", "size")
+
+    def __init__(self, value: Any, fresh_until: float, expires_at: float, size: int):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.expires_at = expires_at
+        self.size = size
+
+
+class TTLCache:
+    """
+    In-memory LRU cache with per-namespace TTLs and an approximate byte budget.
+
+    Keys are namespaced by their prefix before the first underscore (``games_<id>`` -> ``games``),
+    which selects the TTL. The cache is only touched from the event loop, so reads and writes
+    are plain dict operations without locking. Expired entries are dropped on read and by
+    ``sweep()``, which the owner is expected to call periodically.
+
+    Each namespace may also allow a stale window (``namespace_max_stale``): once the TTL has
+    passed the entry is no longer returned by ``get()`` but ``lookup()`` still serves it, flagged
+    as stale, until TTL + max stale, so the owner can revalidate in the background.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 5000,
+        max_bytes: int = 64 * 1024 * 1024,
+        default_ttl: float = 300,
+        namespace_ttls: Optional[Dict[str, float]] = None,
+        namespace_max_stale: Optional[Dict[str, float]] = None,
+    ):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.default_ttl = default_ttl
+        self.namespace_ttls: Dict[str, float] = dict(namespace_ttls or {})
+        self.namespace_max_stale: Dict[str, float] = dict(namespace_max_stale or {})
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    @staticmethod
+    def namespace_of(key: str) -> str:
+        return key.split("_", 1)[0]
+
+    def ttl_for(self, key: str) -> float:
+        return self.namespace_ttls.get(self.namespace_of(key), self.default_ttl)
+
+    def max_stale_for(self, key: str) -> float:
+        return max(0.0, self.namespace_max_stale.get(self.namespace_of(key), 0))
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a fresh value only; stale entries are kept for ``lookup()``."""
+        value, stale = self.lookup(key, allow_stale=False)
+        return value
+
+    def lookup(self, key: str, allow_stale: bool = True) -> Tuple[Optional[Any], bool]:
+        """Return (value, is_stale); (None, False) on a miss or past the hard expiry."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, False
+        now = time.monotonic()
+        if entry.expires_at <= now:
+            self._remove(key)
+            self.misses += 1
+            return None, False
+        stale = entry.fresh_until <= now
+        if stale and not allow_stale:
+            self.misses += 1
+            return None, False
+        self._entries.move_to_end(key)
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return entry.value, stale
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Return a value even if it has expired (not yet swept), without touching LRU order or stats."""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = self.ttl_for(key)
+        if ttl <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        now = time.monotonic()
+        self._entries[key] = _Entry(value, now + ttl, now + ttl + self.max_stale_for(key), size)
+        self._bytes += size
+        self._evict()
+
+    def sweep(self) -> int:
+        """Drop every expired entry, returning how many were removed."""
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        return len(expired)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry.fresh_until > time.monotonic()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,582 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, covers are then used at CDN resolution
+    Image = None
+
+from .resilience import SingleFlight
+
+# How covers are handed to the HTML renderer
+DELIVERY_INLINE = "inline"  # base64 data: URI embedded in the HTML
+DELIVERY_FILE = "file"      # file:// URI, renderer runs on the same machine
+DELIVERY_HTTP = "http"      # served by CoverServer, renderer fetches over HTTP
+
+_LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "0.0.0.0"}
+
+# Bounding boxes (w, h) for each template slot, roughly 2x the CSS size.
+# Covers are scaled down to fit and never scaled up.
+THUMBNAIL_SIZES: Dict[str, Tuple[int, int]] = {
+    "rank": (96, 144),        # group_rank.html .game-cover 48x72
+    "compare": (180, 270),    # compare.html 6-column common games grid
+    "recommend": (200, 300),  # recommend.html .cover 100x150
+    "recent": (240, 360),     # profile.html recent games grid
+    "mosaic": (440, 660),     # profile.html mosaic, largest tile is 4 columns wide
+    "hero": (1280, 720),      # profile / achievement header backgrounds
+}
+
+
+def is_local_endpoint(url: str) -> bool:
+    """Whether an HTTP endpoint (e.g. the t2i renderer) runs on this machine."""
+    if not url:
+        return False
+    host = urlsplit(url if "://" in url else f"http://{url}").hostname or ""
+    return host in _LOCAL_HOSTS
+
+
+class CoverServer:
+    """
+    Minimal static file endpoint exposing cached covers by content hash.
+    Only files registered through ``register`` are served, so the cover directory is never browsable.
+    """
+
+    def __init__(self, host: str, port: int, public_base_url: str = "", logger=None):
+        self.host = host
+        self.port = port
+        self.public_base_url = (public_base_url or f"http://{host}:{port}").rstrip("/")
+        self.logger = logger
+        self._files: Dict[str, Path] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    def register(self, name: str, path: Path) -> str:
+        self._files[name] = path
+        return f"{self.public_base_url}/covers/{name}"
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        path = self._files.get(request.match_info["name"])
+        if path is None or not path.exists():
+            raise web.HTTPNotFound()
+        # Names are content hashes, so responses never change
+        return web.FileResponse(path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+    async def start(self) -> bool:
+        if self._runner is not None:
+            return True
+        app = web.Application()
+        app.router.add_get("/covers/{name}", self._handle)
+        runner = web.AppRunner(app, access_log=None)
+        try:
+            await runner.setup()
+            await web.TCPSite(runner, self.host, self.port).start()
+        except Exception as e:
+            await runner.cleanup()
+            if self.logger:
+                self.logger.warning(f"封面静态服务启动失败（{self.host}:{self.port}），将回退为内联图片：{e}")
+            return False
+        self._runner = runner
+        if self.logger:
+            self.logger.info(f"封面静态服务已启动：{self.public_base_url}")
+        return True
+
+    async def stop(self):
+        runner, self._runner = self._runner, None
+        if runner is not None:
+            await runner.cleanup()
+
+
+class CoverCache:
+    """
+    Downloads Steam CDN covers into ``cover_dir`` and turns them into URIs for the renderer.
+
+    Covers are delivered inline as data URIs by default. In ``file``/``http`` delivery modes the
+    HTML only carries a reference whose name contains the content hash; when a reference cannot
+    be produced (e.g. the static server failed to start) it falls back to a data URI.
+
+    Resolution results are persisted in ``manifest.json`` (``<appid>_<variant>`` -> cached file, or
+    remote fallback URL plus ``missing_until``), so each cover is probed on the CDN at most once per
+    validity window instead of replaying the same 404s on every render.
+
+    The directory is kept under ``max_bytes``: file sizes come from a startup scan (which also drops
+    zero-byte, truncated and leftover ``.tmp`` files), access times are tracked in memory and saved
+    to ``access.json``, and the least recently used files are evicted once the budget is exceeded.
+    """
+
+    MANIFEST_NAME = "manifest.json"
+    ACCESS_NAME = "access.json"
+    THUMB_DIR = "thumbs"
+    MANIFEST_SAVE_DELAY = 2.0
+    # Evict down to this fraction of the budget so we do not evict on every download
+    EVICT_TARGET_RATIO = 0.9
+
+    CDN_BASE = "https://cdn.cloudflare.steamstatic.com/steam/apps"
+    VARIANT_FILES = {
+        "hero": ["library_hero.jpg", "library_hero.png", "header.jpg"],
+        "poster": ["library_600x900.jpg", "library_600x900.png", "header.jpg"],
+    }
+
+    def __init__(
+        self,
+        cover_dir: Path,
+        fetch_bytes: Callable[[str], Awaitable[Optional[bytes]]],
+        logger=None,
+        delivery: str = DELIVERY_INLINE,
+        server: Optional[CoverServer] = None,
+        missing_ttl: float = 24 * 3600,
+        thumbnail_quality: int = 90,
+        max_bytes: int = 0,
+    ):
+        self.cover_dir = Path(cover_dir)
+        self._fetch_bytes = fetch_bytes
+        self.logger = logger
+        self.delivery = delivery
+        self.server = server
+        self.missing_ttl = missing_ttl
+        self.thumbnail_quality = thumbnail_quality
+        # Thumbnail names known to exist on disk, and thumbnails being generated right now
+        self._thumbs: Dict[str, Path] = {}
+        self._thumb_tasks = SingleFlight()
+        # str(path) -> content hash, filled when a file is downloaded or first referenced
+        self._digests: Dict[str, str] = {}
+        self._manifest: Optional[Dict[str, Dict[str, Any]]] = None
+        self._manifest_lock = asyncio.Lock()
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+        self._save_task: Optional[asyncio.Task] = None
+        # Disk budget bookkeeping, keyed by path relative to cover_dir
+        self.max_bytes = max(0, int(max_bytes))
+        self._sizes: Dict[str, int] = {}
+        self._access: Dict[str, float] = {}
+        self._total_bytes = 0
+        self._scanned = False
+        self._evict_task: Optional[asyncio.Task] = None
+        # <appid>_<variant> -> in-flight resolution, so one cover is never downloaded twice at once
+        self._resolving = SingleFlight()
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.cover_dir / self.MANIFEST_NAME
+
+    def _read_manifest(self) -> Dict[str, Dict[str, Any]]:
+        path = self.manifest_path
+        if not path.exists():
+            return {}
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"封面索引读取失败，将重新探测：{e}")
+            return {}
+
+    def _write_json(self, path: Path, snapshot: Dict[str, Any]):
+        self.cover_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def _write_manifest(self, snapshot: Dict[str, Dict[str, Any]], access: Dict[str, float]):
+        self._write_json(self.manifest_path, snapshot)
+        self._write_json(self.cover_dir / self.ACCESS_NAME, access)
+
+    async def _get_manifest(self) -> Dict[str, Dict[str, Any]]:
+        if self._manifest is None:
+            async with self._manifest_lock:
+                if self._manifest is None:
+                    self._manifest = await asyncio.to_thread(self._read_manifest)
+        return self._manifest
+
+    def _schedule_manifest_save(self):
+        if self._save_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._save_handle = loop.call_later(self.MANIFEST_SAVE_DELAY, self._start_manifest_save)
+
+    def _start_manifest_save(self):
+        self._save_handle = None
+        if self._manifest is None:
+            return
+        self._save_task = asyncio.ensure_future(self._save_manifest(dict(self._manifest), dict(self._access)))
+
+    async def _save_manifest(self, snapshot: Dict[str, Dict[str, Any]], access: Dict[str, float]):
+        try:
+            await asyncio.to_thread(self._write_manifest, snapshot, access)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"封面索引写入失败：{e}")
+
+    async def flush(self):
+        """Write pending manifest changes immediately (used on plugin unload)."""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if self._manifest is not None:
+            await self._save_manifest(dict(self._manifest), dict(self._access))
+
+    # ---- disk budget ----
+
+    def _rel(self, path: Path) -> str:
+        try:
+            return path.relative_to(self.cover_dir).as_posix()
+        except ValueError:
+            return path.name
+
+    @staticmethod
+    def _is_complete(path: Path, size: int) -> bool:
+        """Detect files cut short by an interrupted write (missing JPEG EOI / PNG IEND marker)."""
+        if size <= 0:
+            return False
+        suffix = path.suffix.lower()
+        if suffix not in (".jpg", ".jpeg", ".png"):
+            return True
+        with path.open("rb") as f:
+            f.seek(max(0, size - 32))
+            tail = f.read()
+        if suffix == ".png":
+            return tail.endswith(b"IEND\xaeB`\x82")
+        return b"\xff\xd9" in tail
+
+    def _scan_dir(self) -> Tuple[Dict[str, int], Dict[str, float], List[str], Dict[str, float]]:
+        sizes: Dict[str, int] = {}
+        mtimes: Dict[str, float] = {}
+        removed: List[str] = []
+        access: Dict[str, float] = {}
+        if not self.cover_dir.exists():
+            return sizes, mtimes, removed, access
+        access_path = self.cover_dir / self.ACCESS_NAME
+        if access_path.exists():
+            try:
+                with access_path.open("r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, dict):
+                    access = {k: float(v) for k, v in loaded.items()}
+            except Exception:
+                access = {}
+        for root, _dirs, files in os.walk(self.cover_dir):
+            for fname in files:
+                full = Path(root) / fname
+                rel = self._rel(full)
+                if rel in (self.MANIFEST_NAME, self.ACCESS_NAME):
+                    continue
+                try:
+                    st = full.stat()
+                    if fname.endswith(".tmp") or not self._is_complete(full, st.st_size):
+                        full.unlink()
+                        removed.append(rel)
+                        continue
+                except OSError:
+                    continue
+                sizes[rel] = st.st_size
+                mtimes[rel] = st.st_mtime
+        return sizes, mtimes, removed, access
+
+    async def start(self):
+        """Startup integrity scan: drop broken files, measure the directory and enforce the budget."""
+        manifest = await self._get_manifest()
+        try:
+            sizes, mtimes, removed, access = await asyncio.to_thread(self._scan_dir)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"封面缓存目录扫描失败：{e}")
+            return
+        for rel in removed:
+            self._drop(rel)
+        # Files written while the scan was running are already tracked
+        for rel, size in sizes.items():
+            if rel not in self._sizes:
+                self._sizes[rel] = size
+                self._total_bytes += size
+            self._access.setdefault(rel, access.get(rel, mtimes[rel]))
+        # Manifest entries whose file is gone will be re-probed on next use
+        for key, entry in list(manifest.items()):
+            if entry.get("file") and entry["file"] not in self._sizes:
+                manifest.pop(key, None)
+        self._scanned = True
+        if removed and self.logger:
+            self.logger.info(f"封面缓存完整性检查：已清理 {len(removed)} 个损坏或未完成的文件")
+        self._schedule_manifest_save()
+        self._maybe_evict()
+
+    def _touch(self, path: Path):
+        rel = self._rel(path)
+        now = time.time()
+        # Minute granularity is plenty for LRU and keeps access.json writes rare
+        if now - self._access.get(rel, 0) > 60:
+            self._access[rel] = now
+            self._schedule_manifest_save()
+
+    def _track_write(self, path: Path, size: int):
+        rel = self._rel(path)
+        self._total_bytes += size - self._sizes.get(rel, 0)
+        self._sizes[rel] = size
+        self._access[rel] = time.time()
+        self._maybe_evict()
+
+    def _drop(self, rel: str):
+        """Forget everything we know about a file that was (or is about to be) removed."""
+        self._total_bytes -= self._sizes.pop(rel, 0)
+        self._access.pop(rel, None)
+        path = self.cover_dir / rel
+        self._digests.pop(str(path), None)
+        if rel.startswith(f"{self.THUMB_DIR}/"):
+            self._thumbs.pop(path.name, None)
+        elif self._manifest is not None:
+            entry = self._manifest.get(path.stem)
+            if entry and entry.get("file") == rel:
+                self._manifest.pop(path.stem, None)
+
+    def _maybe_evict(self):
+        if not self._scanned or self.max_bytes <= 0 or self._total_bytes <= self.max_bytes:
+            return
+        if self._evict_task is not None and not self._evict_task.done():
+            return
+        self._evict_task = asyncio.ensure_future(self._evict())
+
+    @staticmethod
+    def _unlink_all(paths: List[Path]):
+        for path in paths:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    async def _evict(self):
+        target = int(self.max_bytes * self.EVICT_TARGET_RATIO)
+        victims = []
+        remaining = self._total_bytes
+        for rel in sorted(self._sizes, key=lambda r: self._access.get(r, 0)):
+            if remaining <= target:
+                break
+            victims.append(rel)
+            remaining -= self._sizes[rel]
+        # Update bookkeeping first so lookups stop handing out the victims
+        for rel in victims:
+            self._drop(rel)
+        try:
+            await asyncio.to_thread(self._unlink_all, [self.cover_dir / rel for rel in victims])
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"封面缓存淘汰失败：{e}")
+        if victims:
+            self._schedule_manifest_save()
+            if self.logger:
+                self.logger.debug(f"封面缓存超出上限，已淘汰 {len(victims)} 个文件")
+
+    def candidate_urls(self, app_id: str, variant: str) -> List[str]:
+        files = self.VARIANT_FILES.get(variant, self.VARIANT_FILES["poster"])
+        return [f"{self.CDN_BASE}/{app_id}/{name}" for name in files]
+
+    @staticmethod
+    def _bytes_to_data_uri(data: bytes, mime: str = "jpeg") -> str:
+        encoded = base64.b64encode(data).decode("ascii")
+        return f"data:image/{mime};base64,{encoded}"
+
+    @staticmethod
+    def _mime_of(path: Path) -> str:
+        return "png" if path.suffix.lower() == ".png" else "jpeg"
+
+    @staticmethod
+    def _read_file(path: Path) -> Optional[bytes]:
+        if not path.exists():
+            return None
+        with path.open("rb") as f:
+            return f.read()
+
+    async def _load_cached(self, dest_path: Path) -> Optional[bytes]:
+        try:
+            return await asyncio.to_thread(self._read_file, dest_path)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Failed to read cached cover {dest_path}: {e}")
+            return None
+
+    @staticmethod
+    def _write_file(dest_path: Path, data: bytes):
+        # Write to a temp file and rename, so a partial file is never visible under the final name
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest_path.with_name(dest_path.name + ".tmp")
+        with tmp_path.open("wb") as f:
+            f.write(data)
+        os.replace(tmp_path, dest_path)
+
+    async def _download(self, url: str, dest_path: Path) -> Optional[bytes]:
+        """
+        Download url into dest_path. Returns None only for a definitive miss (404 / 410);
+        throttling, refusals and network errors propagate so they are not negatively cached.
+        """
+        data = await self._fetch_bytes(url)
+        if data:
+            await asyncio.to_thread(self._write_file, dest_path, data)
+            self._track_write(dest_path, len(data))
+            return data
+        return None
+
+    def _reference_uri(self, path: Path, data: Optional[bytes]) -> Optional[str]:
+        """Build a by-reference URI for a cached file, or None when the renderer cannot reach it."""
+        if self.delivery == DELIVERY_INLINE:
+            return None
+        if self.delivery == DELIVERY_HTTP and (self.server is None or not self.server.running):
+            return None
+        key = str(path)
+        digest = self._digests.get(key)
+        if digest is None:
+            if data is None:
+                return None
+            digest = hashlib.sha1(data).hexdigest()[:20]
+            self._digests[key] = digest
+        name = f"{digest}{path.suffix.lower()}"
+        if self.delivery == DELIVERY_HTTP:
+            return self.server.register(name, path)
+        return f"{path.resolve().as_uri()}?v={digest}"
+
+    def _to_uri(self, path: Path, data: bytes) -> str:
+        return self._reference_uri(path, data) or self._bytes_to_data_uri(data, self._mime_of(path))
+
+    async def _uri_for_file(self, path: Path) -> Optional[str]:
+        self._touch(path)
+        if str(path) in self._digests:
+            # Already hashed: a reference does not need the file contents at all
+            reference = self._reference_uri(path, None)
+            if reference:
+                return reference
+        cached = await self._load_cached(path)
+        if cached:
+            return self._to_uri(path, cached)
+        return None
+
+    async def _resolve_file(self, app_id: str, variant: str) -> Tuple[Optional[Path], str]:
+        """
+        Find (or download) the local file for a cover.
+        Returns (path or None, remote fallback URL).
+        """
+        url_candidates = self.candidate_urls(app_id, variant)
+        manifest = await self._get_manifest()
+        manifest_key = f"{app_id}_{variant}"
+
+        entry = manifest.get(manifest_key)
+        if entry:
+            if entry.get("file"):
+                return self.cover_dir / entry["file"], url_candidates[-1]
+            if entry.get("missing_until", 0) > time.time():
+                return None, entry.get("url") or url_candidates[-1]
+
+        network_error = False
+        for url in url_candidates:
+            ext = ".png" if url.lower().endswith(".png") else ".jpg"
+            dest_path = self.cover_dir / f"{app_id}_{variant}{ext}"
+            if await asyncio.to_thread(dest_path.exists):
+                manifest[manifest_key] = {"file": dest_path.name}
+                self._schedule_manifest_save()
+                return dest_path, url_candidates[-1]
+            try:
+                data = await self._download(url, dest_path)
+            except Exception as e:
+                network_error = True
+                if self.logger:
+                    self.logger.warning(f"Failed to download cover {url}: {e}")
+                continue
+            if data:
+                self._digests[str(dest_path)] = hashlib.sha1(data).hexdigest()[:20]
+                manifest[manifest_key] = {"file": dest_path.name}
+                self._schedule_manifest_save()
+                return dest_path, url_candidates[-1]
+
+        # Only remember the miss when every candidate answered 404 / 410; anything else is retried
+        if not network_error:
+            manifest[manifest_key] = {"url": url_candidates[-1], "missing_until": time.time() + self.missing_ttl}
+            self._schedule_manifest_save()
+        return None, url_candidates[-1]
+
+    async def _resolve_shared(self, app_id: str, variant: str) -> Tuple[Optional[Path], str]:
+        return await self._resolving.run(f"{app_id}_{variant}", lambda: self._resolve_file(app_id, variant))
+
+    def _forget(self, app_id: str, variant: str, path: Optional[Path] = None):
+        if self._manifest is not None:
+            self._manifest.pop(f"{app_id}_{variant}", None)
+        if path is not None:
+            self._drop(self._rel(path))
+
+    @staticmethod
+    def _make_thumbnail(src: Path, dest: Path, box: Tuple[int, int], quality: int) -> int:
+        with Image.open(src) as img:
+            img = img.convert("RGB")
+            img.thumbnail(box, Image.LANCZOS)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = dest.with_name(dest.name + ".tmp")
+            img.save(tmp_path, "JPEG", quality=quality, optimize=True)
+        os.replace(tmp_path, dest)
+        return dest.stat().st_size
+
+    async def _ensure_thumbnail(self, src: Path, size: str) -> Optional[Path]:
+        """Return a resized copy of src for the given template slot, generating it off the event loop."""
+        box = THUMBNAIL_SIZES.get(size)
+        if Image is None or box is None:
+            return None
+        name = f"{src.stem}_{box[0]}x{box[1]}.jpg"
+        known = self._thumbs.get(name)
+        if known is not None:
+            return known
+        dest = self.cover_dir / self.THUMB_DIR / name
+
+        async def build() -> Optional[Path]:
+            if not await asyncio.to_thread(dest.exists):
+                size_bytes = await asyncio.to_thread(self._make_thumbnail, src, dest, box, self.thumbnail_quality)
+                self._track_write(dest, size_bytes)
+            self._thumbs[name] = dest
+            return dest
+
+        try:
+            return await self._thumb_tasks.run(name, build)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"封面缩略图生成失败 {src.name} -> {size}：{e}")
+            return None
+
+    async def warm(self, app_id: int, variant: str = "poster", size: Optional[str] = None):
+        """Download a cover (and build its thumbnail) ahead of time without producing a URI."""
+        if not app_id:
+            return
+        path, _ = await self._resolve_shared(str(app_id), variant)
+        if path is not None and size:
+            await self._ensure_thumbnail(path, size)
+
+    async def get_uri(self, app_id: int, variant: str = "poster", size: Optional[str] = None) -> str:
+        """
+        Return a renderable URI for an app cover, downloading it on first use.
+        size selects a template slot from THUMBNAIL_SIZES; the cover is then served downscaled.
+        """
+        if not app_id:
+            return ""
+        app_id = str(app_id)
+        fallback = ""
+        # A manifest entry may point at a file removed from disk; re-probe once in that case
+        for _ in range(2):
+            path, fallback = await self._resolve_shared(app_id, variant)
+            if path is None:
+                return fallback
+            if size:
+                thumb = await self._ensure_thumbnail(path, size)
+                if thumb is not None:
+                    uri = await self._uri_for_file(thumb)
+                    if uri:
+                        return uri
+                    self._thumbs.pop(thumb.name, None)
+            uri = await self._uri_for_file(path)
+            if uri:
+                return uri
+            self._forget(app_id, variant, path)
+        return fallback
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+class DataStore:
+    """
+    SQLite-backed persistent store for data that rarely changes (game schemas, app names)
+    and for derived per-user aggregates that must survive restarts (ranking stats,
+    achievement snapshots, recommendation profiles).
+
+    All disk access runs in a worker thread through ``asyncio.to_thread`` so the event loop
+    never blocks on SQLite. The on-disk layout is versioned with ``PRAGMA user_version``;
+    when ``SCHEMA_VERSION`` changes the cached tables are dropped and rebuilt.
+    """
+
+    SCHEMA_VERSION = 1
+
+    _TABLES = {
+        "schemas": """
+            CREATE TABLE IF NOT EXISTS schemas (
+                appid INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """,
+        "app_names": """
+            CREATE TABLE IF NOT EXISTS app_names (
+                appid INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """,
+        "rank_stats": """
+            CREATE TABLE IF NOT EXISTS rank_stats (
+                steam_id TEXT PRIMARY KEY,
+                game_count INTEGER NOT NULL,
+                total_minutes INTEGER NOT NULL,
+                top_games TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """,
+        "achievement_snapshots": """
+            CREATE TABLE IF NOT EXISTS achievement_snapshots (
+                steam_id TEXT NOT NULL,
+                appid INTEGER NOT NULL,
+                playtime INTEGER NOT NULL,
+                unlocked INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (steam_id, appid)
+            )
+        """,
+        "recommend_profiles": """
+            CREATE TABLE IF NOT EXISTS recommend_profiles (
+                steam_id TEXT PRIMARY KEY,
+                games TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """,
+    }
+
+    def __init__(self, db_path: Path, logger=None):
+        self.db_path = Path(db_path)
+        self.logger = logger
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is not None:
+            return self._conn
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            for table in self._TABLES:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+        for ddl in self._TABLES.values():
+            conn.execute(ddl)
+        conn.commit()
+        self._conn = conn
+        return conn
+
+    def _call(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            conn = self._connect()
+            try:
+                result = func(conn)
+                conn.commit()
+                return result
+            except Exception:
+                conn.rollback()
+                raise
+
+    async def _run(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await asyncio.to_thread(self._call, func)
+
+    async def get_schema(self, app_id: int) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (schema, fetched_at) or None when the app has never been stored."""
+        def query(conn: sqlite3.Connection):
+            return conn.execute(
+                "SELECT payload, fetched_at FROM schemas WHERE appid = ?", (int(app_id),)
+            ).fetchone()
+
+        row = await self._run(query)
+        if not row:
+            return None
+        try:
+            return json.loads(row[0]), row[1]
+        except ValueError:
+            return None
+
+    async def put_schema(self, app_id: int, schema: Dict[str, Any]):
+        payload = json.dumps(schema or {}, ensure_ascii=False, separators=(",", ":"))
+
+        def write(conn: sqlite3.Connection):
+            conn.execute(
+                "INSERT OR REPLACE INTO schemas (appid, payload, fetched_at) VALUES (?, ?, ?)",
+                (int(app_id), payload, time.time()),
+            )
+
+        await self._run(write)
+
+    async def get_app_names(self) -> Dict[int, str]:
+        def query(conn: sqlite3.Connection):
+            return conn.execute("SELECT appid, name FROM app_names").fetchall()
+
+        return {appid: name for appid, name in await self._run(query)}
+
+    async def put_app_names(self, names: Iterable[Tuple[int, str]]):
+        now = time.time()
+        rows = [(int(appid), name, now) for appid, name in names if appid and name]
+        if not rows:
+            return
+
+        def write(conn: sqlite3.Connection):
+            # Only touch rows whose name actually changed to keep the WAL small
+            conn.executemany(
+                """
+                INSERT INTO app_names (appid, name, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(appid) DO UPDATE SET name = excluded.name, updated_at = excluded.updated_at
+                WHERE app_names.name != excluded.name
+                """,
+                rows,
+            )
+
+        await self._run(write)
+
+    async def get_rank_stats(self) -> Dict[str, Tuple[int, int, list, float]]:
+        """steam_id -> (game_count, total_minutes, top_games, updated_at)."""
+        def query(conn: sqlite3.Connection):
+            return conn.execute(
+                "SELECT steam_id, game_count, total_minutes, top_games, updated_at FROM rank_stats"
+            ).fetchall()
+
+        result = {}
+        for steam_id, count, minutes, top_games, updated_at in await self._run(query):
+            try:
+                result[steam_id] = (count, minutes, json.loads(top_games), updated_at)
+            except ValueError:
+                continue
+        return result
+
+    async def put_rank_stats(self, steam_id: str, game_count: int, total_minutes: int, top_games: list):
+        payload = json.dumps(top_games, ensure_ascii=False, separators=(",", ":"))
+
+        def write(conn: sqlite3.Connection):
+            conn.execute(
+                "INSERT OR REPLACE INTO rank_stats (steam_id, game_count, total_minutes, top_games, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (str(steam_id), int(game_count), int(total_minutes), payload, time.time()),
+            )
+
+        await self._run(write)
+
+    async def get_achievement_snapshots(self, steam_id: str) -> Dict[int, Tuple[int, int, int]]:
+        """appid -> (playtime when sampled, unlocked, total) for one user."""
+        def query(conn: sqlite3.Connection):
+            return conn.execute(
+                "SELECT appid, playtime, unlocked, total FROM achievement_snapshots WHERE steam_id = ?",
+                (str(steam_id),),
+            ).fetchall()
+
+        return {appid: (playtime, unlocked, total) for appid, playtime, unlocked, total in await self._run(query)}
+
+    async def put_achievement_snapshots(self, steam_id: str, rows: Iterable[Tuple[int, int, int, int]]):
+        """Upsert (appid, playtime, unlocked, total) rows for one user."""
+        now = time.time()
+        values = [(str(steam_id), int(appid), int(playtime), int(unlocked), int(total), now)
+                  for appid, playtime, unlocked, total in rows]
+        if not values:
+            return
+
+        def write(conn: sqlite3.Connection):
+            conn.executemany(
+                "INSERT OR REPLACE INTO achievement_snapshots "
+                "(steam_id, appid, playtime, unlocked, total, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                values,
+            )
+
+        await self._run(write)
+
+    async def get_recommend_profiles(self) -> Dict[str, list]:
+        """steam_id -> [[appid, playtime_minutes, name], ...]."""
+        def query(conn: sqlite3.Connection):
+            return conn.execute("SELECT steam_id, games FROM recommend_profiles").fetchall()
+
+        result = {}
+        for steam_id, games in await self._run(query):
+            try:
+                result[steam_id] = json.loads(games)
+            except ValueError:
+                continue
+        return result
+
+    async def put_recommend_profile(self, steam_id: str, games: list):
+        payload = json.dumps(games, ensure_ascii=False, separators=(",", ":"))
+
+        def write(conn: sqlite3.Connection):
+            conn.execute(
+                "INSERT OR REPLACE INTO recommend_profiles (steam_id, games, updated_at) VALUES (?, ?, ?)",
+                (str(steam_id), payload, time.time()),
+            )
+
+        await self._run(write)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,95 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from typing import Any, Iterable, List, Mapping, Optional, Sequence
+
+
+class Library:
+    """
+    Compact, indexed view of one user's owned games.
+
+    Appids and playtimes are kept in parallel ``array('q')`` columns sorted by appid, so
+    membership and lookup are a binary search and intersection / difference of two libraries
+    is a single linear merge instead of nested scans over lists of dicts. The original game
+    records are only referenced (never copied) and are handed out for the few games that get
+    displayed. Built once per fetched library and cached by SteamAPI.
+    """
+
+    __slots__ = ("steam_id", "source", "appids", "playtimes", "_records", "_by_playtime", "total_minutes")
+
+    def __init__(self, games: Sequence[Mapping[str, Any]], steam_id: str = ""):
+        self.steam_id = steam_id
+        # The list this view was built from; SteamAPI rebuilds the view when the list is replaced
+        self.source = games
+        rows = sorted(
+            ((int(g["appid"]), g) for g in games if g.get("appid")),
+            key=lambda row: row[0],
+        )
+        self.appids = array("q", (appid for appid, _ in rows))
+        self.playtimes = array("q", (int(g.get("playtime_forever", 0) or 0) for _, g in rows))
+        self._records: Sequence[Mapping[str, Any]] = tuple(g for _, g in rows)
+        # Positions ordered by playtime (desc), for top-N without re-sorting
+        self._by_playtime = array("l", sorted(range(len(rows)), key=self.playtimes.__getitem__, reverse=True))
+        self.total_minutes = sum(self.playtimes)
+
+    def __len__(self) -> int:
+        return len(self.appids)
+
+    def _position(self, appid: int) -> int:
+        pos = bisect_left(self.appids, appid)
+        if pos < len(self.appids) and self.appids[pos] == appid:
+            return pos
+        return -1
+
+    def __contains__(self, appid) -> bool:
+        try:
+            return self._position(int(appid)) >= 0
+        except (TypeError, ValueError):
+            return False
+
+    def get(self, appid) -> Optional[Mapping[str, Any]]:
+        pos = self._position(int(appid))
+        return self._records[pos] if pos >= 0 else None
+
+    def intersection(self, other: "Library") -> List[int]:
+        """Appids owned by both, ascending."""
+        a, b = self.appids, other.appids
+        i = j = 0
+        common = []
+        while i < len(a) and j < len(b):
+            if a[i] == b[j]:
+                common.append(a[i])
+                i += 1
+                j += 1
+            elif a[i] < b[j]:
+                i += 1
+            else:
+                j += 1
+        return common
+
+    def difference(self, other: "Library") -> List[int]:
+        """Appids owned by self but not by other, ascending."""
+        a, b = self.appids, other.appids
+        j = 0
+        only = []
+        for appid in a:
+            while j < len(b) and b[j] < appid:
+                j += 1
+            if j >= len(b) or b[j] != appid:
+                only.append(appid)
+        return only
+
+    def top(self, n: Optional[int] = None, appids: Optional[Iterable[int]] = None) -> List[Mapping[str, Any]]:
+        """
+        Game records by playtime (desc). With appids, only those games are considered
+        (e.g. the result of intersection()); n=None returns all of them.
+        """
+        if appids is None:
+            positions = self._by_playtime if n is None else self._by_playtime[:n]
+            return [self._records[pos] for pos in positions]
+        positions = [pos for pos in map(self._position, appids) if pos >= 0]
+        if n is None:
+            positions.sort(key=self.playtimes.__getitem__, reverse=True)
+        else:
+            positions = heapq.nlargest(n, positions, key=self.playtimes.__getitem__)
+        return [self._records[pos] for pos in positions]
@@ -1,15 +1,27 @@
-import base64
-import json
-import difflib
 import asyncio
 from pathlib import Path
-from typing import Optional, Tuple, Dict, List, Any
-import aiohttp
+from typing import Optional, Tuple, Dict, List, Any, Mapping, Sequence
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register, StarTools
 from astrbot.api import logger
 from astrbot.api import message_components as Comp
-from .steam_api import SteamAPI
+from .steam_api import SteamAPI, SteamAPIError
+from .resilience import Deadline
+from .cache import TTLCache
+from .data_store import DataStore
+from .binding_store import BindingStore
+from .cover_cache import CoverCache, CoverServer, DELIVERY_FILE, DELIVERY_HTTP, DELIVERY_INLINE, is_local_endpoint
+from .template_registry import PASSTHROUGH_TEMPLATE, TemplateRegistry
+from .render_cache import RenderCache
+from .prefetch import PrefetchScheduler
+from .rank_index import RankIndex
+from .library import Library
+from .achievements import AchievementEngine, count_total, count_unlocked
+from .search_index import SearchHit, SearchIndexCache
+from .recommend import RecommendEngine
+
+REQUIRED_TEMPLATES = ("profile.html", "achievement.html", "compare.html", "recommend.html", "group_rank.html")
+TEMPLATE_UNAVAILABLE_TEXT = "模板文件缺失或无法解析，请检查插件 templates 目录（详见日志）。"
 
 @register("steam_game", "bvzrays", "Steam Player Data Visualization", "1.6.0", "https://github.com/bvzrays/astrbot_plugin_steamgame")
 class SteamGamePlugin(Star):
@@ -22,52 +34,174 @@ class SteamGamePlugin(Star):
         self.image_quality = max(10, min(100, self.image_quality))
         self.recommend_source_limit = max(10, int(self.config.get("recommend_source_limit", 40)))
         self.recommend_result_limit = max(3, int(self.config.get("recommend_result_limit", 6)))
+        self.http_connect_timeout = max(1, int(self.config.get("http_connect_timeout", 10)))
+        self.http_read_timeout = max(1, int(self.config.get("http_read_timeout", 30)))
+        self.api_requests_per_second = max(0.1, float(self.config.get("api_requests_per_second", 4)))
+        self.api_max_concurrency = max(1, int(self.config.get("api_max_concurrency", 8)))
+        self.api_max_retries = max(0, int(self.config.get("api_max_retries", 3)))
+        # In-flight library fetches per group command; the rate limiter paces them further
+        self.group_fetch_concurrency = self.api_max_concurrency * 2
+        self.command_timeout = max(3, int(self.config.get("command_timeout", 20)))
+        self.breaker_threshold = max(1, int(self.config.get("circuit_failure_threshold", 5)))
+        self.breaker_recovery = max(5, int(self.config.get("circuit_recovery_seconds", 30)))
+        cache_ttls = dict(SteamAPI.DEFAULT_CACHE_TTLS)
+        for namespace in ("summary", "games", "friends", "schema"):
+            ttl = self.config.get(f"cache_ttl_{namespace}")
+            if ttl is not None:
+                cache_ttls[namespace] = max(0, int(ttl))
+        max_stale = dict(SteamAPI.DEFAULT_MAX_STALE)
+        for namespace in ("summary", "games", "friends"):
+            stale = self.config.get(f"cache_max_stale_{namespace}")
+            if stale is not None:
+                max_stale[namespace] = max(0, int(stale))
+        api_cache = TTLCache(
+            max_entries=max(100, int(self.config.get("cache_max_entries", 5000))),
+            max_bytes=max(8, int(self.config.get("cache_max_memory_mb", 64))) * 1024 * 1024,
+            namespace_ttls=cache_ttls,
+            namespace_max_stale=max_stale,
+        )
         
         if not self.api_key:
             logger.warning("Steam API Key not set in config! Plugin will not work correctly.")
             
-        self.steam_api = SteamAPI(self.api_key, self.proxy, logger=logger)
-        
         # Data storage for bindings
         plugin_dir = Path(__file__).resolve().parent
         plugin_name = plugin_dir.name
         self.data_dir: Path = StarTools.get_data_dir(plugin_name)
-        self.data_file: Path = self.data_dir / "steam_binding.json"
+        self.data_store = DataStore(self.data_dir / "steam_cache.db", logger=logger)
+        schema_cache_days = max(1, int(self.config.get("schema_cache_days", 7)))
+
+        self.steam_api = SteamAPI(
+            self.api_key,
+            self.proxy,
+            logger=logger,
+            connect_timeout=self.http_connect_timeout,
+            read_timeout=self.http_read_timeout,
+            cache=api_cache,
+            store=self.data_store,
+            schema_revalidate_after=schema_cache_days * 86400,
+            breaker_threshold=self.breaker_threshold,
+            breaker_recovery=self.breaker_recovery,
+            requests_per_second=self.api_requests_per_second,
+            max_concurrency=self.api_max_concurrency,
+            max_retries=self.api_max_retries,
+        )
+
+        self.rank_index = RankIndex(self.data_store, logger=logger)
+        self.achievements = AchievementEngine(
+            self.steam_api,
+            self.data_store,
+            logger=logger,
+            concurrency=max(1, int(self.config.get("achievement_concurrency", 4))),
+            refresh_limit=max(1, int(self.config.get("achievement_refresh_limit", 8))),
+        )
+        self.search_indexes = SearchIndexCache(self.data_store, logger=logger)
+        self.recommender = RecommendEngine(
+            self.data_store,
+            logger=logger,
+            source_limit=self.recommend_source_limit,
+            weighting=str(self.config.get("recommend_weighting", "log") or "log").lower(),
+            normalization=str(self.config.get("recommend_normalization", "cosine") or "cosine").lower(),
+        )
+        self.steam_api.add_owned_games_listener(self.rank_index.update)
+        self.steam_api.add_owned_games_listener(self.recommender.update)
+        self._background_tasks = set()
+        self.binding_store = BindingStore(
+            self.data_dir / "steam_binding.db",
+            legacy_file=self.data_dir / "steam_binding.json",
+            logger=logger,
+        )
         self.cover_dir: Path = self.data_dir / "covers"
+        self.cover_server: Optional[CoverServer] = None
+        cover_delivery = self._resolve_cover_delivery()
+        self.cover_cache = CoverCache(
+            self.cover_dir,
+            self.steam_api.fetch_bytes,
+            logger=logger,
+            delivery=cover_delivery,
+            server=self.cover_server,
+            missing_ttl=max(1, int(self.config.get("cover_missing_ttl_hours", 24))) * 3600,
+            thumbnail_quality=self.image_quality,
+            max_bytes=max(0, int(self.config.get("cover_cache_max_mb", 512))) * 1024 * 1024,
+        )
         self.templates_dir: Path = plugin_dir / "templates"
-        self.bindings, self.group_bindings = self._load_bindings()
-        logger.info(f"SteamGamePlugin: 已载入 {len(self.bindings)} 个绑定，数据文件 {self.data_file}")
+        self.templates = TemplateRegistry(self.templates_dir, REQUIRED_TEMPLATES, logger=logger)
+        self.render_cache = RenderCache(
+            self.data_dir / "renders",
+            ttl=max(0, int(self.config.get("render_cache_ttl", 300))),
+            max_bytes=max(1, int(self.config.get("render_cache_max_mb", 128))) * 1024 * 1024,
+            logger=logger,
+        )
+        # Live views of the store; every change goes through self.binding_store
+        self.bindings = self.binding_store.users
+        self.group_bindings = self.binding_store.groups
+        self.prefetch_enabled = bool(self.config.get("prefetch_enabled", True))
+        self.prefetcher = PrefetchScheduler(
+            self.steam_api,
+            self.cover_cache,
+            lambda: self.group_bindings,
+            logger=logger,
+            interval=max(1, int(self.config.get("prefetch_interval_minutes", 10))) * 60,
+            active_window=max(1, int(self.config.get("prefetch_active_days", 3))) * 86400,
+        )
 
-    def _load_bindings(self):
-        if self.data_file.exists():
-            try:
-                with self.data_file.open("r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    # Backward compatibility: older versions stored a flat dict
-                    if isinstance(data, dict) and "users" in data and "groups" in data:
-                        return data.get("users", {}), data.get("groups", {})
-                    if isinstance(data, dict):
-                        return data, {}
-            except Exception as e:
-                logger.error(f"Failed to load bindings: {e}")
-                return {}, {}
-        return {}, {}
-
-    def _save_bindings(self):
+    def _resolve_cover_delivery(self) -> str:
+        """
+        决定封面交给渲染器的方式：inline 为 base64 内联；file/http 为按引用传递。
+        渲染器无法访问本机资源时自动回退为 inline。
+        """
+        delivery = str(self.config.get("cover_delivery", DELIVERY_INLINE) or DELIVERY_INLINE).lower()
+        if delivery not in (DELIVERY_FILE, DELIVERY_HTTP):
+            return DELIVERY_INLINE
+        t2i_endpoint = ""
         try:
-            self.data_dir.mkdir(parents=True, exist_ok=True)
-            with self.data_file.open("w", encoding="utf-8") as f:
-                json.dump(
-                    {
-                        "users": self.bindings,
-                        "groups": self.group_bindings,
-                    },
-                    f,
-                    indent=2,
-                    ensure_ascii=False,
-                )
-        except Exception as e:
-            logger.error(f"Failed to save bindings: {e}")
+            t2i_endpoint = self.context.get_config().get("t2i_endpoint", "") or ""
+        except Exception:
+            pass
+        renderer_is_local = is_local_endpoint(t2i_endpoint)
+        if delivery == DELIVERY_FILE:
+            if not renderer_is_local:
+                logger.warning("cover_delivery=file 需要渲染服务运行在本机（t2i_endpoint 指向 localhost），已回退为内联图片。")
+                return DELIVERY_INLINE
+            return DELIVERY_FILE
+        public_base_url = self.config.get("cover_public_base_url", "") or ""
+        # Without a public URL the server is only reachable from this machine
+        if not renderer_is_local and not public_base_url:
+            logger.warning("cover_delivery=http 需要渲染服务运行在本机，或配置 cover_public_base_url，已回退为内联图片。")
+            return DELIVERY_INLINE
+        self.cover_server = CoverServer(
+            host=self.config.get("cover_server_host", "127.0.0.1") or "127.0.0.1",
+            port=int(self.config.get("cover_server_port", 16186) or 16186),
+            public_base_url=public_base_url,
+            logger=logger,
+        )
+        return DELIVERY_HTTP
+
+    async def initialize(self):
+        """插件启用时载入绑定、预编译模板、载入排行索引、检查封面缓存目录，并启动封面静态服务（仅 cover_delivery=http）。"""
+        await self.binding_store.load()
+        logger.info(f"SteamGamePlugin: 已载入 {len(self.bindings)} 个绑定，数据文件 {self.binding_store.db_path}")
+        await asyncio.to_thread(self.templates.load)
+        await self.rank_index.load()
+        await self.recommender.load()
+        self._spawn(self.cover_cache.start())
+        self._spawn(self.render_cache.start())
+        if self.prefetch_enabled and self.api_key:
+            self.prefetcher.start()
+        if self.cover_server is not None:
+            await self.cover_server.start()
+
+    async def terminate(self):
+        """插件卸载时写回绑定与封面索引，并关闭共享的 HTTP 连接池与持久化缓存。"""
+        await self.prefetcher.stop()
+        for task in list(self._background_tasks):
+            task.cancel()
+        if self.cover_server is not None:
+            await self.cover_server.stop()
+        await self.binding_store.close()
+        await self.cover_cache.flush()
+        await self.steam_api.close()
+        self.data_store.close()
 
     def _link_user_to_group(self, user_id: str, group_id: Optional[str]) -> bool:
         """Track which group has access to which binding."""
@@ -76,11 +210,7 @@ class SteamGamePlugin(Star):
         steam_id = self.bindings.get(user_id)
         if not steam_id:
             return False
-        group_map = self.group_bindings.setdefault(group_id, {})
-        if group_map.get(user_id) != steam_id:
-            group_map[user_id] = steam_id
-            return True
-        return False
+        return self.binding_store.link(group_id, user_id, steam_id)
 
     def _sync_group_binding_value(self, user_id: str) -> bool:
         """Ensure historical group bindings use the latest steam id."""
@@ -88,12 +218,58 @@ class SteamGamePlugin(Star):
         steam_id = self.bindings.get(user_id)
         if not steam_id:
             return False
-        for group_map in self.group_bindings.values():
-            if user_id in group_map and group_map[user_id] != steam_id:
-                group_map[user_id] = steam_id
+        for group_id in self.binding_store.groups_of(user_id):
+            if self.binding_store.link(group_id, user_id, steam_id):
                 changed = True
         return changed
 
+    def _api_error_text(self, error: SteamAPIError) -> str:
+        if error.throttled:
+            return "Steam 接口请求过于频繁（已被限流），请稍后再试。"
+        if error.status:
+            return f"Steam 接口请求失败（状态码 {error.status}），请稍后再试或检查 Steam API Key。"
+        return "无法连接 Steam，请检查网络/代理设置后重试。"
+
+    async def _render_template(self, name: str, data: Dict[str, Any], options: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        用预编译模板在本地渲染 HTML，再交给渲染器截图；模板不可用时返回 None。
+        相同 HTML 与参数的截图在 render_cache_ttl 内直接复用。
+        """
+        html = self.templates.render(name, data)
+        if html is None:
+            return None
+        if not self.render_cache.enabled:
+            return await self.html_render(PASSTHROUGH_TEMPLATE, {"html": html}, options=options)
+        return await self.render_cache.get_or_render(
+            html,
+            options,
+            lambda: self.html_render(PASSTHROUGH_TEMPLATE, {"html": html}, return_url=False, options=options),
+        )
+
+    def _refresh_libraries(self, steam_ids: List[str]):
+        """后台逐个刷新游戏库（经限流器），刷新结果通过回调更新排行索引。"""
+        async def run():
+            for steam_id in steam_ids:
+                try:
+                    await self.steam_api.get_owned_games(steam_id)
+                except SteamAPIError:
+                    continue
+
+        self._spawn(run())
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """启动后台任务：保留引用直到结束（事件循环只持有弱引用），并记录异常。"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+
+        def _done(t: asyncio.Task):
+            self._background_tasks.discard(t)
+            if not t.cancelled() and t.exception():
+                logger.warning(f"SteamGamePlugin 后台任务失败：{t.exception()}")
+
+        task.add_done_callback(_done)
+        return task
+
     def _format_playtime(self, minutes):
         if minutes < 60:
             return f"{minutes} 分钟"
@@ -101,31 +277,11 @@ class SteamGamePlugin(Star):
         days = hours / 24
         return f"{int(hours)}h ({days:.1f}d)"
 
-    async def _aggregate_achievements(self, steam_id: str, games: list, limit: int = 12) -> dict:
-        """Estimate achievement progress by sampling top games."""
-        unlocked = 0
-        total = 0
-        if not games or not steam_id:
-            return {"unlocked": 0, "total": 0}
-
-        sampled_games = games[:limit]
-        for game in sampled_games:
-            app_id = game.get("appid")
-            if not app_id:
-                continue
-            stats = await self.steam_api.get_user_stats_for_game(steam_id, app_id)
-            if not stats:
-                continue
-            schema = await self.steam_api.get_schema_for_game(app_id)
-            if not schema:
-                continue
-            achievements_schema = schema.get("availableGameStats", {}).get("achievements", [])
-            total += len(achievements_schema)
-
-            user_achievements = stats.get("achievements", [])
-            unlocked += sum(1 for ach in user_achievements if ach.get("achieved", 0) == 1 or ach.get("unlocktime"))
-
-        return {"unlocked": unlocked, "total": total}
+    @staticmethod
+    def _format_achievements(totals: Mapping[str, int]) -> str:
+        """“已解锁/总数”，仍有游戏未统计时加 ≈ 前缀。"""
+        text = f"{totals.get('unlocked', 0)}/{totals.get('total', 0) or '-'}"
+        return f"≈{text}" if totals.get("pending") else text
 
     def _build_metric(
         self,
@@ -155,89 +311,69 @@ class SteamGamePlugin(Star):
             "right": {"value": right_display, "result": right_result, "badge": badge_map[right_result]},
         }
 
-    def _bytes_to_data_uri(self, data: bytes, mime: str = "jpeg") -> str:
-        encoded = base64.b64encode(data).decode("ascii")
-        return f"data:image/{mime};base64,{encoded}"
-
-    def _load_cached_cover(self, dest_path: Path) -> Optional[str]:
-        if not dest_path.exists():
-            return None
-        try:
-            with dest_path.open("rb") as f:
-                data = f.read()
-            mime = "png" if dest_path.suffix.lower() == ".png" else "jpeg"
-            return self._bytes_to_data_uri(data, mime)
-        except Exception as e:
-            logger.warning(f"Failed to read cached cover {dest_path}: {e}")
-            return None
-
-    async def _download_cover(self, url: str, dest_path: Path) -> Optional[bytes]:
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, proxy=self.proxy) as resp:
-                    if resp.status == 200:
-                        data = await resp.read()
-                        dest_path.parent.mkdir(parents=True, exist_ok=True)
-                        with dest_path.open("wb") as f:
-                            f.write(data)
-                        return data
-        except Exception as e:
-            logger.warning(f"Failed to download cover {url}: {e}")
-        return None
-
-    async def _ensure_cover_uri(self, app_id: int, variant: str = "poster") -> str:
-        if not app_id:
-            return ""
-        app_id = str(app_id)
-        base = f"https://cdn.cloudflare.steamstatic.com/steam/apps/{app_id}"
-        url_candidates = []
-        if variant == "hero":
-            url_candidates = [
-                f"{base}/library_hero.jpg",
-                f"{base}/library_hero.png",
-                f"{base}/header.jpg"
-            ]
-        else:
-            url_candidates = [
-                f"{base}/library_600x900.jpg",
-                f"{base}/library_600x900.png",
-                f"{base}/header.jpg"
-            ]
+    def _remote_cover_url(self, app_id, variant: str = "poster") -> str:
+        """CDN 原图地址：封面未能在指令时限内落地时交给渲染器自行加载。"""
+        return self.cover_cache.candidate_urls(str(app_id), variant)[-1] if app_id else ""
+
+    async def _ensure_cover_uri(
+        self, app_id: int, variant: str = "poster", size: Optional[str] = None, deadline: Optional[Deadline] = None
+    ) -> str:
+        if deadline is None:
+            return await self.cover_cache.get_uri(app_id, variant, size)
+        # The download itself is shielded in the cover cache and still completes in the background
+        return await deadline.run(
+            self.cover_cache.get_uri(app_id, variant, size), lambda: self._remote_cover_url(app_id, variant)
+        )
 
-        for url in url_candidates:
-            ext = ".png" if url.lower().endswith(".png") else ".jpg"
-            dest_path = self.cover_dir / f"{app_id}_{variant}{ext}"
-            cached = self._load_cached_cover(dest_path)
-            if cached:
-                return cached
-            data = await self._download_cover(url, dest_path)
-            if data:
-                mime = "png" if ext == ".png" else "jpeg"
-                return self._bytes_to_data_uri(data, mime)
-
-        # Download failed, fall back to last candidate URL
-        return url_candidates[-1]
-
-    async def _decorate_games_with_cover(self, games, variant: str = "poster"):
+    async def _decorate_games_with_cover(
+        self, games, variant: str = "poster", size: Optional[str] = None, deadline: Optional[Deadline] = None
+    ):
         tasks = []
         index_map = []
         for idx, game in enumerate(games):
             appid = game.get("appid")
             if not appid:
                 continue
-            tasks.append(self._ensure_cover_uri(appid, variant))
+            tasks.append(self.cover_cache.get_uri(appid, variant, size))
             index_map.append(idx)
 
         if not tasks:
             return
 
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        if deadline is not None:
+            results = await deadline.gather(
+                tasks, lambda i: self._remote_cover_url(games[index_map[i]].get("appid"), variant)
+            )
+        else:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
         for idx, cover in zip(index_map, results):
-            if isinstance(cover, Exception):
-                logger.warning(f"Cover fetch failed: {cover}")
+            if isinstance(cover, BaseException):
+                logger.warning(f"Cover fetch failed: {cover!r}")
                 continue
             games[idx]["cover_uri"] = cover
 
+    async def _build_game_views(
+        self,
+        games: Sequence[Mapping[str, Any]],
+        limit: Optional[int] = None,
+        variant: Optional[str] = "poster",
+        playtime_field: Optional[str] = None,
+        size: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Build template view models for the games that will actually be displayed.
+        Cached game records are read-only and shared, so only the first `limit` games are
+        copied into mutable views that get a cover resolved and a formatted playtime.
+        """
+        views = [dict(game) for game in (games[:limit] if limit is not None else games)]
+        if playtime_field:
+            for view in views:
+                view[f"{playtime_field}_formatted"] = self._format_playtime(view.get(playtime_field, 0))
+        if variant:
+            await self._decorate_games_with_cover(views, variant, size, deadline)
+        return views
+
     def _ensure_static_avatar(self, summary: Optional[Dict[str, Any]], size: str = "full") -> str:
         """
         Steam 会在用户设置动态头像时返回 gif，这里将其转换为 jpg，避免 HTML 渲染时出现动图。
@@ -270,16 +406,16 @@ class SteamGamePlugin(Star):
         - Digits: Use as Steam ID directly.
         """
         # 1. Check if mentioned
-        save_needed = False
         group_id = event.get_group_id()
+        self.prefetcher.touch(group_id)
         steam_id = None
 
         for component in event.message_obj.message:
             if isinstance(component, Comp.At):
                 target_user_id = str(component.qq)
                 steam_id = self.bindings.get(target_user_id)
-                if steam_id and group_id and self._link_user_to_group(target_user_id, group_id):
-                    save_needed = True
+                if steam_id and group_id:
+                    self._link_user_to_group(target_user_id, group_id)
                 break
         
         # 2. Check if explicit ID (digits)
@@ -290,10 +426,8 @@ class SteamGamePlugin(Star):
         if not steam_id and allow_fallback:
             user_id = str(event.get_sender_id())
             steam_id = self.bindings.get(user_id)
-            if steam_id and group_id and self._link_user_to_group(user_id, group_id):
-                save_needed = True
-        if save_needed:
-            self._save_bindings()
+            if steam_id and group_id:
+                self._link_user_to_group(user_id, group_id)
         return steam_id
 
     @filter.command("绑定steam", prefix_optional=True)
@@ -301,33 +435,65 @@ class SteamGamePlugin(Star):
         '''绑定 Steam ID（在新的群聊中可不填参数同步已有绑定）'''
         user_id = str(event.get_sender_id())
         group_id = event.get_group_id()
+        self.prefetcher.touch(group_id)
         message = ""
 
-        data_changed = False
-
         if steam_id:
             # Validate Steam ID (must be 64-bit integer, usually 17 digits)
             if not steam_id.isdigit() or len(steam_id) != 17:
                 yield event.plain_result("绑定失败：请输入正确的 17 位 Steam ID 64 (例如 76561198000000000)。")
                 return
-            self.bindings[user_id] = steam_id
-            data_changed = True
+            # bind() also carries a new Steam ID over to every group the user is in
+            rebound = self.binding_store.bind(user_id, steam_id)
             message = f"绑定成功！已关联 Steam ID: {steam_id}"
+            shared = len(self.binding_store.users_of(steam_id) - {user_id})
+            if shared:
+                message += f"\n提示：该 Steam ID 还被另外 {shared} 位用户绑定，排行中会重复计入。"
         else:
             if user_id not in self.bindings:
                 yield event.plain_result("你还没有绑定 Steam ID，请使用 /绑定steam <SteamID64>。")
                 return
             steam_id = self.bindings[user_id]
+            rebound = False
             message = "已将现有绑定同步至当前群聊。"
 
-        if self._sync_group_binding_value(user_id):
-            data_changed = True
-        if self._link_user_to_group(user_id, group_id):
-            data_changed = True
-        if data_changed:
-            self._save_bindings()
+        if not rebound:
+            # Group entries imported from the legacy JSON may still hold an older Steam ID
+            self._sync_group_binding_value(user_id)
+        # Persisted by the binding store's write-behind
+        self._link_user_to_group(user_id, group_id)
+        if self.rank_index.missing([steam_id]):
+            self._refresh_libraries([steam_id])
         yield event.plain_result(message)
 
+    @filter.command("解绑steam", prefix_optional=True)
+    async def unbind(self, event: AstrMessageEvent, scope: str = ""):
+        '''解除 Steam 绑定 (/解绑steam [本群])'''
+        user_id = str(event.get_sender_id())
+        group_id = event.get_group_id()
+        scope = (scope or "").strip()
+        # Only an empty scope removes every binding; anything unrecognized changes nothing
+        if scope not in ("", "本群"):
+            yield event.plain_result("用法：/解绑steam [本群]")
+            return
+        if user_id not in self.bindings:
+            yield event.plain_result("你还没有绑定 Steam ID。")
+            return
+
+        if scope == "本群":
+            if not group_id:
+                yield event.plain_result("请在群聊中使用 /解绑steam 本群。")
+                return
+            if not self.binding_store.unlink(group_id, user_id):
+                yield event.plain_result("你在本群没有同步的绑定。")
+                return
+            yield event.plain_result("已将你从本群的 Steam 排行/推荐中移除，其他群与私聊中的绑定保留。")
+            return
+
+        groups = self.binding_store.groups_of(user_id)
+        steam_id = self.binding_store.unbind(user_id)
+        yield event.plain_result(f"已解除与 Steam ID {steam_id} 的绑定（同步移除 {len(groups)} 个群聊中的记录）。")
+
     async def _render_profile(self, event: AstrMessageEvent, steam_id: str, mode: str):
         if not self.api_key:
             yield event.plain_result("请先在配置文件中设置 Steam API Key。")
@@ -337,8 +503,21 @@ class SteamGamePlugin(Star):
             yield event.plain_result("未找到绑定的 Steam ID。请先绑定 (/绑定steam <id>) 或指定 ID。")
             return
 
+        deadline = Deadline(self.command_timeout)
         # Fetch Data (force refresh for summary mode to get current playing status)
-        summary = await self.steam_api.get_player_summaries(steam_id, force_refresh=(mode == "summary"))
+        try:
+            summary = await deadline.run(
+                self.steam_api.get_player_summaries(steam_id, force_refresh=(mode == "summary")),
+                lambda: self.steam_api.peek_player_summary(steam_id),
+            )
+        except SteamAPIError as e:
+            summary = self.steam_api.peek_player_summary(steam_id)
+            if not summary:
+                yield event.plain_result(self._api_error_text(e))
+                return
+        if summary is None and deadline.expired:
+            yield event.plain_result("Steam 响应超时，且暂无缓存数据，请稍后再试。")
+            return
         if not summary:
             yield event.plain_result("未找到该 Steam 用户，请检查 ID 是否正确，或检查网络/代理设置。")
             return
@@ -348,36 +527,50 @@ class SteamGamePlugin(Star):
         
         owned_games = []
         recent_games = []
+        mosaic_games = []
         hero_cover = summary.get("avatarfull", "")
 
         if not is_private:
             # Always fetch owned games to show total count and playtime
-            owned_games = await self.steam_api.get_owned_games(steam_id)
-            recent_games = await self.steam_api.get_recently_played_games(steam_id)
-            await self._decorate_games_with_cover(owned_games, "poster")
-            await self._decorate_games_with_cover(recent_games, "poster")
+            try:
+                owned_games = await deadline.run(
+                    self.steam_api.get_owned_games(steam_id),
+                    lambda: self.steam_api.peek_owned_games(steam_id),
+                )
+            except SteamAPIError as e:
+                owned_games = self.steam_api.peek_owned_games(steam_id)
+                if owned_games is None:
+                    yield event.plain_result(self._api_error_text(e))
+                    return
+            if owned_games is None:
+                if mode == "library":
+                    yield event.plain_result("Steam 响应超时，且暂无缓存数据，请稍后再试。")
+                    return
+                owned_games = []
+            if mode == "library":
+                # Mosaic Layout Logic: only the top 100 tiles are rendered
+                mosaic_games = await self._build_game_views(
+                    owned_games, limit=100, playtime_field="playtime_forever", size="mosaic", deadline=deadline
+                )
+                for i, game in enumerate(mosaic_games):
+                    if i == 0: game["grid_class"] = "span-4x4"
+                    elif i < 5: game["grid_class"] = "span-2x2"
+                    elif i < 15: game["grid_class"] = "span-2x1" if i % 2 == 0 else "span-1x2"
+                    else: game["grid_class"] = "span-1x1"
+            else:
+                # Recent games are only shown on the summary card
+                try:
+                    recent_games = await deadline.run(self.steam_api.get_recently_played_games(steam_id), [])
+                except SteamAPIError:
+                    recent_games = []
+                recent_games = await self._build_game_views(
+                    recent_games, playtime_field="playtime_2weeks", size="recent", deadline=deadline
+                )
             if owned_games:
-                hero_cover = await self._ensure_cover_uri(owned_games[0]["appid"], "hero")
+                hero_cover = await self._ensure_cover_uri(owned_games[0]["appid"], "hero", "hero", deadline)
                 if not hero_cover:
                     hero_cover = summary.get("avatarfull", "")
 
-        # Process Data
-        for game in owned_games:
-            game["playtime_forever_formatted"] = self._format_playtime(game.get("playtime_forever", 0))
-        
-        for game in recent_games:
-            game["playtime_2weeks_formatted"] = self._format_playtime(game.get("playtime_2weeks", 0))
-
-        # Mosaic Layout Logic (Only for Library mode)
-        mosaic_games = []
-        if mode == "library" and owned_games:
-            mosaic_games = owned_games[:100] # Take top 100
-            for i, game in enumerate(mosaic_games):
-                if i == 0: game["grid_class"] = "span-4x4"
-                elif i < 5: game["grid_class"] = "span-2x2"
-                elif i < 15: game["grid_class"] = "span-2x1" if i % 2 == 0 else "span-1x2"
-                else: game["grid_class"] = "span-1x1"
-
         # Check if playing
         playing_game = None
         if summary.get("gameextrainfo"):
@@ -385,21 +578,21 @@ class SteamGamePlugin(Star):
                 "name": summary.get("gameextrainfo"),
                 "appid": summary.get("gameid")
             }
-            cover_uri = await self._ensure_cover_uri(summary.get("gameid"), "hero")
+            cover_uri = await self._ensure_cover_uri(summary.get("gameid"), "hero", "hero", deadline)
             playing_game["cover_uri"] = cover_uri or hero_cover
 
         # Render
-        template_path = self.templates_dir / "profile.html"
-        with template_path.open("r", encoding="utf-8") as f:
-            template_content = f.read()
-            
-        bans_data = await self.steam_api.get_player_bans(steam_id)
+        try:
+            # Ban status is optional on the card: omitted rather than waited for
+            bans_data = await deadline.run(self.steam_api.get_player_bans(steam_id), None)
+        except SteamAPIError:
+            bans_data = None
         ban_info = bans_data[0] if bans_data else None
 
-        img_url = await self.html_render(
-            template_content, {
+        img_url = await self._render_template(
+            "profile.html", {
                 "player": summary,
-                "owned_games": mosaic_games if mode == "library" else owned_games,
+                "owned_games": mosaic_games,
                 "recent_games": recent_games,
                 "total_games": len(owned_games),
                 "total_playtime": self._format_playtime(sum(g.get("playtime_forever", 0) for g in owned_games)),
@@ -417,6 +610,9 @@ class SteamGamePlugin(Star):
                 "quality": self.image_quality
             }
         )
+        if not img_url:
+            yield event.plain_result(TEMPLATE_UNAVAILABLE_TEXT)
+            return
         yield event.image_result(img_url)
 
     @filter.command("steam动态", prefix_optional=True)
@@ -448,35 +644,47 @@ class SteamGamePlugin(Star):
             yield event.plain_result("请先绑定 Steam ID。")
             return
 
+        deadline = Deadline(self.command_timeout)
         # 1. Search for game in owned games
-        owned_games = await self.steam_api.get_owned_games(steam_id)
-        
-        # Fuzzy Search Logic
-        game_names = [g["name"] for g in owned_games]
-        matches = difflib.get_close_matches(game_name, game_names, n=5, cutoff=0.4)
-        
-        target_game = None
-        
-        # Exact match check (case-insensitive)
-        for game in owned_games:
-            if game_name.lower() == game["name"].lower():
-                target_game = game
-                break
-        
+        try:
+            library = await deadline.run(
+                self.steam_api.get_library(steam_id),
+                lambda: self.steam_api.peek_library(steam_id),
+            )
+        except SteamAPIError as e:
+            library = self.steam_api.peek_library(steam_id)
+            if library is None:
+                yield event.plain_result(self._api_error_text(e))
+                return
+        if library is None:
+            yield event.plain_result("Steam 响应超时，且暂无缓存数据，请稍后再试。")
+            return
+
+        hits = (await self.search_indexes.for_library(library)).search(game_name, limit=5)
+        target_game = hits[0].record if hits and hits[0].confident else None
+        catalog_hits = []
+
         if not target_game:
-            # Substring match check
-            for game in owned_games:
-                if game_name.lower() in game["name"].lower():
-                    target_game = game
-                    break
-        
+            # Typos and games the user does not own resolve through the shared name catalog
+            catalog = await deadline.run(self.search_indexes.catalog(), None)
+            catalog_hits = catalog.search(game_name, limit=5) if catalog else []
+            if catalog_hits and catalog_hits[0].confident:
+                appid = catalog_hits[0].record["appid"]
+                if appid in library:
+                    target_game = library.get(appid)
+                elif catalog_hits[0].kind in (SearchHit.EXACT, SearchHit.ALIAS, SearchHit.APPID):
+                    yield event.plain_result(f"你的游戏库中没有《{catalog_hits[0].record['name']}》。")
+                    return
+
         if not target_game:
-            if matches:
-                # If multiple matches found, ask user to be specific
-                # But for better UX, if the first match is very close, we might just use it?
-                # Let's just list them.
+            suggestions = []
+            for hit in hits + catalog_hits:
+                name = hit.record.get("name")
+                if name and name not in suggestions:
+                    suggestions.append(name)
+            if suggestions:
                 msg = "未找到精确匹配的游戏，你是不是想找：\n"
-                for i, m in enumerate(matches):
+                for i, m in enumerate(suggestions[:5]):
                     msg += f"{i+1}. {m}\n"
                 msg += "请尝试使用更完整的名称。"
                 yield event.plain_result(msg)
@@ -488,20 +696,33 @@ class SteamGamePlugin(Star):
         app_id = target_game["appid"]
         
         # 2. Fetch Schema & Stats
-        schema = await self.steam_api.get_schema_for_game(app_id)
-        achievements_all = schema.get("availableGameStats", {}).get("achievements", []) if schema else []
-        if not achievements_all:
-            yield event.plain_result(f"《{target_game['name']}》似乎没有可查询的 Steam 成就。")
-            return
+        try:
+            schema = await deadline.run(self.steam_api.get_schema_for_game(app_id), None)
+            if schema is None and deadline.expired:
+                yield event.plain_result("Steam 响应超时，请稍后再试。")
+                return
+            achievements_all = schema.get("availableGameStats", {}).get("achievements", []) if schema else []
+            if not achievements_all:
+                yield event.plain_result(f"《{target_game['name']}》似乎没有可查询的 Steam 成就。")
+                return
 
-        stats = await self.steam_api.get_user_stats_for_game(steam_id, app_id)
+            stats = await deadline.run(self.steam_api.get_user_stats_for_game(steam_id, app_id), None)
+            # A timed-out stats call must not be shown (or recorded) as zero unlocked
+            if stats is None and deadline.expired:
+                yield event.plain_result("Steam 响应超时，请稍后再试。")
+                return
+        except SteamAPIError as e:
+            yield event.plain_result(self._api_error_text(e))
+            return
         user_achievements = stats.get("achievements", []) if stats else []
         user_achievements_map = {a["name"]: a for a in user_achievements}
         
-        unlocked_count = sum(
-            1 for a in user_achievements_map.values() if a.get("achieved", 0) == 1 or a.get("unlocktime")
+        unlocked_count = count_unlocked(stats)
+        total_count = count_total(schema)
+        # Keep the library-wide snapshot in sync with what we just fetched
+        await self.achievements.record(
+            steam_id, [(int(app_id), int(target_game.get("playtime_forever", 0) or 0), unlocked_count, total_count)]
         )
-        total_count = len(achievements_all)
         completion_rate = (unlocked_count / total_count * 100) if total_count > 0 else 0
         
         unlocked_display = []
@@ -524,7 +745,7 @@ class SteamGamePlugin(Star):
         if len(display_achievements) < 8:
             display_achievements.extend(locked_display[: 8 - len(display_achievements)])
 
-        cover_uri = await self._ensure_cover_uri(app_id, "hero")
+        cover_uri = await self._ensure_cover_uri(app_id, "hero", "hero", deadline)
 
         render_data = {
             "game": target_game,
@@ -536,16 +757,8 @@ class SteamGamePlugin(Star):
             "game_cover": cover_uri
         }
         
-        template_path = self.templates_dir / "achievement.html"
-        if not template_path.exists():
-             yield event.plain_result("成就模板尚未上传。")
-             return
-
-        with template_path.open("r", encoding="utf-8") as f:
-            template_content = f.read()
-            
-        img_url = await self.html_render(
-            template_content,
+        img_url = await self._render_template(
+            "achievement.html",
             render_data,
             options={
                 "width": 700,
@@ -555,6 +768,9 @@ class SteamGamePlugin(Star):
                 "quality": self.image_quality
             }
         )
+        if not img_url:
+            yield event.plain_result(TEMPLATE_UNAVAILABLE_TEXT)
+            return
         yield event.image_result(img_url)
 
     @filter.command("steam对比", prefix_optional=True)
@@ -579,76 +795,89 @@ class SteamGamePlugin(Star):
             yield event.plain_result("不能和自己对比哦。")
             return
 
-        # Fetch both
-        my_games = await self.steam_api.get_owned_games(my_id)
-        target_games = await self.steam_api.get_owned_games(target_id)
+        deadline = Deadline(self.command_timeout)
+        # Fetch both, falling back to the last cached library when Steam is slow or down
+        pair_ids = (my_id, target_id)
+        my_library, target_library = await deadline.gather(
+            (self.steam_api.get_library(sid) for sid in pair_ids),
+            lambda i: self.steam_api.peek_library(pair_ids[i]),
+        )
+        errors = [r for r in (my_library, target_library) if isinstance(r, BaseException)]
+        if errors:
+            stale = [self.steam_api.peek_library(sid) for sid in pair_ids]
+            my_library = my_library if isinstance(my_library, Library) else stale[0]
+            target_library = target_library if isinstance(target_library, Library) else stale[1]
+            if my_library is None or target_library is None:
+                error = next((e for e in errors if isinstance(e, SteamAPIError)), None)
+                if error is None:
+                    raise errors[0]
+                yield event.plain_result(self._api_error_text(error))
+                return
         
-        if not my_games or not target_games:
+        if not my_library or not target_library:
             yield event.plain_result("无法获取双方的游戏库，请检查 Steam API Key 或网络代理。")
             return
         
-        my_summary = await self.steam_api.get_player_summaries(my_id) or {}
-        target_summary = await self.steam_api.get_player_summaries(target_id) or {}
+        my_summary, target_summary = await deadline.gather(
+            (self.steam_api.get_player_summaries(sid) for sid in pair_ids),
+            lambda i: self.steam_api.peek_player_summary(pair_ids[i]),
+        )
+        my_summary = my_summary if isinstance(my_summary, dict) else {}
+        target_summary = target_summary if isinstance(target_summary, dict) else {}
         self._ensure_static_avatar(my_summary)
         self._ensure_static_avatar(target_summary)
 
-        # Calculate Intersection
-        my_game_ids = {g["appid"] for g in my_games}
-        target_game_ids = {g["appid"] for g in target_games}
-        common_ids = my_game_ids.intersection(target_game_ids)
-        
-        common_games = []
-        for gid in common_ids:
-            # Find game info
-            g = next((x for x in my_games if x["appid"] == gid), None)
-            if g: common_games.append(g)
-            
-        # Sort by my playtime
-        common_games.sort(key=lambda x: x.get("playtime_forever", 0), reverse=True)
-        
-        # Calculate unique games
-        only_me_ids = my_game_ids - target_game_ids
-        only_target_ids = target_game_ids - my_game_ids
-
-        only_me = [g for g in my_games if g["appid"] in only_me_ids]
-        only_target = [g for g in target_games if g["appid"] in only_target_ids]
-
-        # Sort unique games by playtime
-        only_me.sort(key=lambda x: x.get("playtime_forever", 0), reverse=True)
-        only_target.sort(key=lambda x: x.get("playtime_forever", 0), reverse=True)
-
-        my_total_minutes = sum(g.get("playtime_forever", 0) for g in my_games)
-        target_total_minutes = sum(g.get("playtime_forever", 0) for g in target_games)
-
-        # Achievement aggregation (sample top games to avoid heavy requests)
-        my_ach_task = asyncio.create_task(self._aggregate_achievements(my_id, my_games))
-        target_ach_task = asyncio.create_task(self._aggregate_achievements(target_id, target_games))
-        my_achievements, target_achievements = await asyncio.gather(my_ach_task, target_ach_task)
+        # Intersection / differences are linear merges over the sorted appid columns;
+        # only the displayed games are materialized, ordered by playtime
+        common_ids = my_library.intersection(target_library)
+        common_games = my_library.top(12, common_ids)
+        only_me = my_library.top(12, my_library.difference(target_library))
+        only_target = target_library.top(12, target_library.difference(my_library))
+
+        my_total_minutes = my_library.total_minutes
+        target_total_minutes = target_library.total_minutes
+
+        # Library-wide totals from the stored snapshots only; games played since the last
+        # sample are re-queried in the background and show up in the next comparison
+        no_achievements = {"unlocked": 0, "total": 0}
+        my_achievements, target_achievements = await asyncio.gather(
+            self.achievements.aggregate(my_id, my_library),
+            self.achievements.aggregate(target_id, target_library),
+            return_exceptions=True,
+        )
+        if not isinstance(my_achievements, dict):
+            my_achievements = dict(no_achievements)
+        if not isinstance(target_achievements, dict):
+            target_achievements = dict(no_achievements)
+        if my_achievements.get("pending"):
+            self._spawn(self.achievements.refresh(my_id, my_library))
+        if target_achievements.get("pending"):
+            self._spawn(self.achievements.refresh(target_id, target_library))
+        achievements_partial = bool(my_achievements.get("pending") or target_achievements.get("pending"))
 
         if not common_games:
             yield event.plain_result("双方似乎没有共同拥有的游戏。")
             return
 
-        top_common = common_games[:12]
-        await self._decorate_games_with_cover(top_common, "poster")
+        top_common = await self._build_game_views(common_games, limit=12, size="compare", deadline=deadline)
 
         render_data = {
             "me": {
                 "personaname": my_summary.get("personaname", "Player 1"),
                 "avatarfull": my_summary.get("avatarfull", ""),
-                "count": len(my_games)
+                "count": len(my_library)
             },
             "target": {
                 "personaname": target_summary.get("personaname", "Player 2"),
                 "avatarfull": target_summary.get("avatarfull", ""),
-                "count": len(target_games)
+                "count": len(target_library)
             },
             "common_games": top_common,
-            "common_count": len(common_games),
-            "only_me": only_me[:12],
-            "only_target": only_target[:12],
+            "common_count": len(common_ids),
+            "only_me": only_me,
+            "only_target": only_target,
             "metrics": [
-                self._build_metric("游戏数量", len(my_games), len(target_games)),
+                self._build_metric("游戏数量", len(my_library), len(target_library)),
                 self._build_metric(
                     "总时长",
                     my_total_minutes,
@@ -657,27 +886,18 @@ class SteamGamePlugin(Star):
                     right_display=self._format_playtime(target_total_minutes),
                 ),
                 self._build_metric(
-                    "成就完成数",
+                    # Totals still missing games (refresh limit / deadline) are only approximate
+                    "成就完成数（部分统计）" if achievements_partial else "成就完成数",
                     my_achievements.get("unlocked", 0),
                     target_achievements.get("unlocked", 0),
-                    left_display=f"{my_achievements.get('unlocked', 0)}/{my_achievements.get('total', 0)}"
-                    if my_achievements.get("total")
-                    else f"{my_achievements.get('unlocked', 0)}/-",
-                    right_display=f"{target_achievements.get('unlocked', 0)}/{target_achievements.get('total', 0)}"
-                    if target_achievements.get("total")
-                    else f"{target_achievements.get('unlocked', 0)}/-",
+                    left_display=self._format_achievements(my_achievements),
+                    right_display=self._format_achievements(target_achievements),
                 ),
             ]
         }
         
-        template_path = self.templates_dir / "compare.html"
-        if not template_path.exists():
-             yield event.plain_result("对比模板尚未上传。")
-             return
-        with template_path.open("r", encoding="utf-8") as f:
-            template_content = f.read()
-        img_url = await self.html_render(
-            template_content,
+        img_url = await self._render_template(
+            "compare.html",
             render_data,
             options={
                 "width": 800,
@@ -687,12 +907,16 @@ class SteamGamePlugin(Star):
                 "quality": self.image_quality
             }
         )
+        if not img_url:
+            yield event.plain_result(TEMPLATE_UNAVAILABLE_TEXT)
+            return
         yield event.image_result(img_url)
 
     @filter.command("steam推荐", prefix_optional=True)
     async def steam_recommend(self, event: AstrMessageEvent, arg: str = ""):
         '''群友热门游戏推荐 (/steam推荐 [@用户])'''
         group_id = event.get_group_id()
+        self.prefetcher.touch(group_id)
         if not group_id:
             yield event.plain_result("请在群聊中使用该指令。")
             return
@@ -707,86 +931,88 @@ class SteamGamePlugin(Star):
             yield event.plain_result("未找到目标用户的 Steam 绑定。")
             return
 
-        user_games = await self.steam_api.get_owned_games(target_steam_id)
-        if not user_games:
+        deadline = Deadline(self.command_timeout)
+        try:
+            user_library = await deadline.run(
+                self.steam_api.get_library(target_steam_id),
+                lambda: self.steam_api.peek_library(target_steam_id),
+            )
+        except SteamAPIError as e:
+            user_library = self.steam_api.peek_library(target_steam_id)
+            if user_library is None:
+                yield event.plain_result(self._api_error_text(e))
+                return
+        if not user_library:
             yield event.plain_result("无法获取目标用户的游戏库。")
             return
 
-        user_appids = {g.get("appid") for g in user_games}
-
-        others = [sid for sid in group_binding_map.values() if sid and sid != target_steam_id]
+        others = list(dict.fromkeys(sid for sid in group_binding_map.values() if sid and sid != target_steam_id))
         if not others:
             yield event.plain_result("群内没有其他已绑定的用户，暂无法推荐。")
             return
 
-        tasks = [self.steam_api.get_owned_games(steam_id) for steam_id in others]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        recommendations = {}
-        for steam_id, games in zip(others, results):
-            if not isinstance(games, list):
-                continue
-            for game in games[: self.recommend_source_limit]:
-                appid = game.get("appid")
-                if not appid or appid in user_appids:
-                    continue
-                minutes = game.get("playtime_forever", 0)
-                if minutes <= 0:
-                    continue
-                entry = recommendations.setdefault(
-                    appid,
-                    {
-                        "appid": appid,
-                        "name": game.get("name", f"App {appid}"),
-                        "score": 0,
-                        "owners": set(),
-                        "cover_uri": game.get("cover_uri"),
-                    },
-                )
-                entry["score"] += minutes
-                entry["owners"].add(steam_id)
-
-        if not recommendations:
+        # Only members unknown to the recommendation index are fetched now (the owned-games
+        # listener indexes them); the rest are served from the index and refreshed in the background
+        missing = self.recommender.missing(others)
+        failed = 0
+        async for _, result in deadline.as_completed(
+            (self.steam_api.get_owned_games(sid) for sid in missing), limit=self.group_fetch_concurrency
+        ):
+            if not isinstance(result, tuple):
+                failed += 1
+        outdated = [sid for sid in others if sid not in missing and not self.steam_api.is_fresh(f"games_{sid}")]
+        if outdated:
+            self._refresh_libraries(outdated)
+
+        top_items = self.recommender.recommend(
+            target_steam_id,
+            user_library,
+            others,
+            self.recommend_result_limit,
+            target_games=user_library.top(self.recommend_source_limit),
+        )
+        if not top_items:
+            if failed:
+                yield event.plain_result(f"有 {failed} 位群友的游戏库获取失败（Steam 接口限流或网络异常），暂无法推荐，请稍后再试。")
+                return
             yield event.plain_result("未找到可推荐的游戏，可能你已经拥有群友的热门作品。")
             return
 
-        top_items = sorted(
-            recommendations.values(),
-            key=lambda x: (x["score"], len(x["owners"])),
-            reverse=True,
-        )[: self.recommend_result_limit]
-
-        await self._decorate_games_with_cover(top_items, "poster")
+        await self._decorate_games_with_cover(top_items, "poster", "recommend", deadline)
 
+        summary_ids = [target_steam_id]
+        for item in top_items:
+            for owner_id in list(item["owners"])[:6]:
+                if owner_id not in summary_ids:
+                    summary_ids.append(owner_id)
+        summaries = await deadline.gather(
+            (self.steam_api.get_player_summaries(sid) for sid in summary_ids),
+            lambda i: self.steam_api.peek_player_summary(summary_ids[i]),
+        )
         summary_cache = {}
-
-        async def get_summary_cached(steam_id: str):
-            if steam_id not in summary_cache:
-                summary_cache[steam_id] = await self.steam_api.get_player_summaries(steam_id) or {}
-                self._ensure_static_avatar(summary_cache[steam_id])
-            return summary_cache[steam_id]
+        for sid, summary in zip(summary_ids, summaries):
+            summary_cache[sid] = summary if isinstance(summary, dict) else {}
+            self._ensure_static_avatar(summary_cache[sid])
 
         render_recommendations = []
         for item in top_items:
-            hours = item["score"] / 60
+            hours = item["minutes"] / 60
             owner_avatars = []
             for owner_id in list(item["owners"])[:6]:
-                summary = await get_summary_cached(owner_id)
-                self._ensure_static_avatar(summary)
+                summary = summary_cache[owner_id]
                 avatar = summary.get("avatarfull")
                 if avatar:
                     owner_avatars.append(avatar)
             render_recommendations.append({
                 "name": item["name"],
-                "score": item["score"],
+                "score": item["minutes"],
                 "playtime": f"{hours:.1f}",
                 "owners": len(item["owners"]),
                 "owner_avatars": owner_avatars,
                 "cover_uri": item.get("cover_uri"),
             })
 
-        target_summary = await get_summary_cached(target_steam_id)
-        self._ensure_static_avatar(target_summary)
+        target_summary = summary_cache[target_steam_id]
         render_data = {
             "target": {
                 "personaname": target_summary.get("personaname", event.get_sender_name()),
@@ -795,15 +1021,8 @@ class SteamGamePlugin(Star):
             "recommendations": render_recommendations
         }
 
-        template_path = self.templates_dir / "recommend.html"
-        if not template_path.exists():
-            yield event.plain_result("推荐模板尚未上传。")
-            return
-        with template_path.open("r", encoding="utf-8") as f:
-            template_content = f.read()
-
-        img_url = await self.html_render(
-            template_content,
+        img_url = await self._render_template(
+            "recommend.html",
             render_data,
             options={
                 "width": 800,
@@ -813,12 +1032,16 @@ class SteamGamePlugin(Star):
                 "quality": self.image_quality
             }
         )
+        if not img_url:
+            yield event.plain_result(TEMPLATE_UNAVAILABLE_TEXT)
+            return
         yield event.image_result(img_url)
 
     @filter.command("steam联动", prefix_optional=True)
     async def steam_network(self, event: AstrMessageEvent):
         '''群内 Steam 好友联动与同玩提醒'''
         group_id = event.get_group_id()
+        self.prefetcher.touch(group_id)
         if not group_id:
             yield event.plain_result("请在群聊中使用该指令。")
             return
@@ -834,18 +1057,23 @@ class SteamGamePlugin(Star):
             yield event.plain_result("至少需要两位已绑定用户才能分析联动。")
             return
 
-        summary_cache: Dict[str, Dict[str, Any]] = {}
-
-        async def get_summary_cached(steam_id: str):
-            if steam_id not in summary_cache:
-                summary_cache[steam_id] = await self.steam_api.get_player_summaries(steam_id) or {}
-            return summary_cache[steam_id]
+        deadline = Deadline(self.command_timeout)
+        friend_lists = asyncio.ensure_future(
+            deadline.gather(self.steam_api.get_friend_list(sid) for sid in steam_ids)
+        )
 
-        friend_tasks = {sid: asyncio.create_task(self.steam_api.get_friend_list(sid)) for sid in steam_ids}
+        # Issued together so the API layer merges them into 100-ID requests
+        summaries = await deadline.gather(
+            (self.steam_api.get_player_summaries(sid) for sid in steam_ids),
+            lambda i: self.steam_api.peek_player_summary(steam_ids[i]),
+        )
+        summary_cache: Dict[str, Dict[str, Any]] = {
+            sid: summary if isinstance(summary, dict) else {} for sid, summary in zip(steam_ids, summaries)
+        }
 
         playing_map: Dict[str, Dict[str, Any]] = {}
         for sid in steam_ids:
-            summary = await get_summary_cached(sid)
+            summary = summary_cache[sid]
             game_id = summary.get("gameid")
             if summary.get("gameextrainfo") and game_id:
                 playing_entry = playing_map.setdefault(
@@ -855,8 +1083,10 @@ class SteamGamePlugin(Star):
                 playing_entry["players"].append(sid)
 
         edges = set()
-        for sid, task in friend_tasks.items():
-            friends = await task
+        for sid, friends in zip(steam_ids, await friend_lists):
+            # Failed or timed-out friend lists are skipped
+            if not isinstance(friends, list):
+                continue
             for fid in friends:
                 if fid in steam_to_user and sid in steam_to_user and fid != sid:
                     pair = tuple(sorted([sid, fid]))
@@ -894,12 +1124,12 @@ class SteamGamePlugin(Star):
     async def steam_top(self, event: AstrMessageEvent, dimension: str = "游戏数"):
         '''群内排行 (/steam排行 [游戏数/时长])'''
         group_id = event.get_group_id()
+        self.prefetcher.touch(group_id)
         if not group_id:
             yield event.plain_result("请在群聊中使用该指令。")
             return
         # Ensure caller至少同步
-        if self._link_user_to_group(str(event.get_sender_id()), group_id):
-            self._save_bindings()
+        self._link_user_to_group(str(event.get_sender_id()), group_id)
 
         # Map dimension to internal key
         dim_map = {
@@ -918,69 +1148,59 @@ class SteamGamePlugin(Star):
         title = "群内 Steam 游戏数排行" if sort_by == "count" else "群内 Steam 肝帝排行"
         yield event.plain_result(f"正在统计{title}，请稍候...")
 
-        rank_data = []
-        
-        tasks = []
-        user_ids = []
-        
-        for user_id, steam_id in group_binding_map.items():
-            tasks.append(self.steam_api.get_owned_games(steam_id))
-            user_ids.append(user_id)
-            
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Also fetch summaries for avatars
-        summary_tasks = [self.steam_api.get_player_summaries(group_binding_map[uid]) for uid in user_ids]
-        summaries = await asyncio.gather(*summary_tasks, return_exceptions=True)
-        
-        for i, games in enumerate(results):
-            if isinstance(games, list):
-                user_id = user_ids[i]
-                summary = summaries[i] if isinstance(summaries[i], dict) else {}
-                self._ensure_static_avatar(summary)
-                
-                # Calculate metrics
-                game_count = len(games)
-                total_minutes = sum(g.get("playtime_forever", 0) for g in games)
-                
-                # Sort games by playtime for display
-                games.sort(key=lambda x: x.get("playtime_forever", 0), reverse=True)
-                
-                top_games = games[:5]
-                await self._decorate_games_with_cover(top_games, "poster")
-
-                rank_data.append({
-                    "user_id": user_id,
-                    "name": summary.get("personaname", f"User {user_id}"),
-                    "avatar": summary.get("avatarfull", ""),
-                    "count": game_count,
-                    "time_minutes": total_minutes,
-                    "time_str": self._format_playtime(total_minutes),
-                    "top_games": top_games # Top 5 games for display
-                })
-        
-        # Sort
-        if sort_by == "time":
-            rank_data.sort(key=lambda x: x["time_minutes"], reverse=True)
-        else:
-            rank_data.sort(key=lambda x: x["count"], reverse=True)
-        
-        if not rank_data:
-            yield event.plain_result("无法获取排行数据。")
+        # Members without an index entry are fetched now (the listener fills the index);
+        # everyone else is read from the index, with stale libraries refreshed in the background
+        steam_ids = list(dict.fromkeys(sid for sid in group_binding_map.values() if sid))
+        missing = self.rank_index.missing(steam_ids)
+        deadline = Deadline(self.command_timeout)
+        # Libraries are consumed as they arrive and dropped right after indexing, with a
+        # bounded number in flight, so memory does not grow with the group size
+        first_error: Optional[SteamAPIError] = None
+        async for _, result in deadline.as_completed(
+            (self.steam_api.get_owned_games(sid) for sid in missing), limit=self.group_fetch_concurrency
+        ):
+            if first_error is None and isinstance(result, SteamAPIError):
+                first_error = result
+        outdated = [sid for sid in steam_ids if sid not in missing and not self.steam_api.is_fresh(f"games_{sid}")]
+        if outdated:
+            self._refresh_libraries(outdated)
+
+        winners = self.rank_index.top(group_binding_map, sort_by, 10)
+        if not winners:
+            yield event.plain_result(self._api_error_text(first_error) if first_error else "无法获取排行数据。")
             return
-            
+
+        # Avatars and covers are only needed for the displayed members
+        summaries = await deadline.gather(
+            (self.steam_api.get_player_summaries(stats.steam_id) for _, stats in winners),
+            lambda i: self.steam_api.peek_player_summary(winners[i][1].steam_id),
+        )
+        top_games_list = await asyncio.gather(
+            *(self._build_game_views(stats.top_games, limit=5, size="rank", deadline=deadline) for _, stats in winners)
+        )
+
+        rank_data = []
+        for (user_id, stats), summary, top_games in zip(winners, summaries, top_games_list):
+            summary = summary if isinstance(summary, dict) else {}
+            self._ensure_static_avatar(summary)
+            rank_data.append({
+                "user_id": user_id,
+                "name": summary.get("personaname", f"User {user_id}"),
+                "avatar": summary.get("avatarfull", ""),
+                "count": stats.count,
+                "time_minutes": stats.minutes,
+                "time_str": self._format_playtime(stats.minutes),
+                "top_games": top_games # Top 5 games for display
+            })
+
         render_data = {
             "title": title,
             "sort_by": sort_by,
-            "ranks": rank_data[:10] # Top 10
+            "ranks": rank_data # Top 10
         }
         
-        template_path = self.templates_dir / "group_rank.html"
-        with template_path.open("r", encoding="utf-8") as f:
-            template_content = f.read()
-        
-        img_url = await self.html_render(
-            template_content,
+        img_url = await self._render_template(
+            "group_rank.html",
             render_data,
             options={
                 "width": 800,
@@ -990,5 +1210,8 @@ class SteamGamePlugin(Star):
                 "quality": self.image_quality
             }
         )
+        if not img_url:
+            yield event.plain_result(TEMPLATE_UNAVAILABLE_TEXT)
+            return
         yield event.image_result(img_url)
 
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+from .cover_cache import CoverCache
+from .steam_api import SteamAPI, SteamAPIError
+
+
+class PrefetchScheduler:
+    """
+    Background warm-up of bound users' data so interactive commands hit the cache.
+
+    Every ``interval`` seconds the scheduler walks the bound groups, most recently active
+    first, and refreshes the owned games (plus the covers shown by /steam排行) of every member
+    whose cached library is no longer fresh; summaries are refreshed in 100-ID batches.
+    Requests are spread over the cycle and the scheduler yields whenever the shared rate
+    limiter drops below ``token_reserve`` of its capacity or the API circuit is open, so
+    interactive commands always keep the quota they need.
+    """
+
+    # Covers pre-built per member: the slots /steam排行 renders
+    COVER_SLOTS = (("poster", "rank"),)
+    TOP_GAMES = 5
+    PRESSURE_POLL = 1.0
+
+    def __init__(
+        self,
+        steam_api: SteamAPI,
+        cover_cache: CoverCache,
+        get_groups: Callable[[], Dict[str, Dict[str, str]]],
+        logger=None,
+        interval: float = 600,
+        active_window: float = 3 * 86400,
+        token_reserve: float = 0.5,
+    ):
+        self.steam_api = steam_api
+        self.cover_cache = cover_cache
+        self.get_groups = get_groups
+        self.logger = logger
+        self.interval = max(60.0, float(interval))
+        self.active_window = max(0.0, float(active_window))
+        self.token_reserve = min(0.9, max(0.0, float(token_reserve)))
+        self._activity: Dict[str, float] = {}
+        self._started_at = time.time()
+        self._task: Optional[asyncio.Task] = None
+        self.refreshed = 0
+        self.skipped_warm = 0
+        self.failures = 0
+
+    def touch(self, group_id: Optional[str]):
+        """Record that a group just used the plugin."""
+        if group_id:
+            self._activity[str(group_id)] = time.time()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def _ordered_steam_ids(self) -> List[str]:
+        """Unique steam ids of active groups, most recently active group first."""
+        now = time.time()
+        groups = self.get_groups()
+        # Activity is not persisted: right after boot, groups not seen yet may still be active
+        include_unseen = now - self._started_at < self.active_window
+        ranked = []
+        for group_id, members in groups.items():
+            last = self._activity.get(group_id)
+            if last is None:
+                if include_unseen:
+                    ranked.append((0.0, group_id))
+            elif now - last <= self.active_window:
+                ranked.append((last, group_id))
+        ranked.sort(reverse=True)
+
+        steam_ids: List[str] = []
+        seen = set()
+        for _, group_id in ranked:
+            for steam_id in groups.get(group_id, {}).values():
+                if steam_id and steam_id not in seen:
+                    seen.add(steam_id)
+                    steam_ids.append(steam_id)
+        return steam_ids
+
+    async def _wait_for_capacity(self):
+        limiter = self.steam_api.rate_limiter
+        breaker = self.steam_api.breakers["api"]
+        # An open circuit is waited out only until its recovery timeout: nothing else may be
+        # sending requests, so the scheduler's next call becomes the half-open probe itself
+        while (
+            limiter.available < limiter.capacity * self.token_reserve
+            or not breaker.would_allow()
+        ):
+            await asyncio.sleep(self.PRESSURE_POLL)
+
+    async def _loop(self):
+        # Let the plugin finish starting before competing for the quota
+        await asyncio.sleep(min(30.0, self.interval))
+        while True:
+            started = time.monotonic()
+            try:
+                await self.run_cycle()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"Steam 数据预取失败：{e}")
+            await asyncio.sleep(max(1.0, self.interval - (time.monotonic() - started)))
+
+    async def run_cycle(self):
+        steam_ids = self._ordered_steam_ids()
+        if not steam_ids:
+            return
+        # Counters describe the current cycle only
+        self.refreshed = self.skipped_warm = self.failures = 0
+        # Spread the cycle's requests over most of the interval instead of bursting
+        spacing = self.interval * 0.8 / max(1, len(steam_ids))
+
+        for start in range(0, len(steam_ids), SteamAPI.MAX_IDS_PER_REQUEST):
+            chunk = [sid for sid in steam_ids[start:start + SteamAPI.MAX_IDS_PER_REQUEST]
+                     if not self.steam_api.is_fresh(f"summary_{sid}")]
+            if chunk:
+                await self._wait_for_capacity()
+                try:
+                    await self.steam_api.get_player_summaries(",".join(chunk), force_refresh=True)
+                except SteamAPIError:
+                    self.failures += 1
+
+        for steam_id in steam_ids:
+            if self.steam_api.is_fresh(f"games_{steam_id}"):
+                self.skipped_warm += 1
+                continue
+            await self._wait_for_capacity()
+            try:
+                games = await self.steam_api.get_owned_games(steam_id, force_refresh=True)
+            except SteamAPIError:
+                self.failures += 1
+                games = []
+            else:
+                self.refreshed += 1
+            for game in games[: self.TOP_GAMES]:
+                for variant, size in self.COVER_SLOTS:
+                    await self.cover_cache.warm(game.get("appid"), variant, size)
+            await asyncio.sleep(spacing)
+
+        if self.logger:
+            self.logger.debug(
+                f"Steam 数据预取完成：共 {len(steam_ids)} 人，刷新 {self.refreshed}，"
+                f"跳过 {self.skipped_warm}，失败 {self.failures}"
+            )
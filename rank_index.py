@@ -0,0 +1,90 @@
+import asyncio
+import heapq
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from .data_store import DataStore
+
+
+class RankStats:
+    __slots__ = ("steam_id", "count", "minutes", "top_games")
+
+    def __init__(self, steam_id: str, count: int, minutes: int, top_games: List[Dict[str, Any]]):
+        self.steam_id = steam_id
+        self.count = count
+        self.minutes = minutes
+        self.top_games = top_games
+
+
+class RankIndex:
+    """
+    Per-member aggregates behind /steam排行: game count, total playtime and the top games.
+
+    Entries are updated whenever SteamAPI fetches a member's owned games (see
+    ``SteamAPI.add_owned_games_listener``) and written through to the DataStore, so a group
+    ranking is a dictionary lookup per member plus a top-k selection, and works right after
+    a restart. Group membership is not stored here: callers pass the group's current steam
+    ids, so binding changes take effect immediately.
+    """
+
+    TOP_GAMES = 5
+
+    def __init__(self, store: Optional[DataStore] = None, logger=None):
+        self.store = store
+        self.logger = logger
+        self._stats: Dict[str, RankStats] = {}
+        self._background = set()
+
+    async def load(self):
+        if self.store is None:
+            return
+        try:
+            rows = await self.store.get_rank_stats()
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"读取排行索引失败：{e}")
+            return
+        for steam_id, (count, minutes, top_games, _) in rows.items():
+            # Entries refreshed while loading are newer than the stored ones
+            self._stats.setdefault(steam_id, RankStats(steam_id, count, minutes, top_games))
+
+    def update(self, steam_id: str, games: Sequence[Mapping[str, Any]]):
+        """Recompute one member's aggregates from a freshly fetched library."""
+        steam_id = str(steam_id)
+        count = len(games)
+        minutes = sum(g.get("playtime_forever", 0) for g in games)
+        top = heapq.nlargest(self.TOP_GAMES, games, key=lambda g: g.get("playtime_forever", 0))
+        top_games = [
+            {"appid": g.get("appid"), "name": g.get("name", ""), "playtime_forever": g.get("playtime_forever", 0)}
+            for g in top
+        ]
+        current = self._stats.get(steam_id)
+        if current is not None and (current.count, current.minutes, current.top_games) == (count, minutes, top_games):
+            return
+        self._stats[steam_id] = RankStats(steam_id, count, minutes, top_games)
+        if self.store is not None:
+            task = asyncio.ensure_future(self.store.put_rank_stats(steam_id, count, minutes, top_games))
+            self._background.add(task)
+            task.add_done_callback(self._on_persisted)
+
+    def _on_persisted(self, task: asyncio.Future):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() and self.logger:
+            self.logger.warning(f"写入排行索引失败：{task.exception()}")
+
+    def get(self, steam_id: str) -> Optional[RankStats]:
+        return self._stats.get(str(steam_id))
+
+    def missing(self, steam_ids: Iterable[str]) -> List[str]:
+        return [sid for sid in steam_ids if str(sid) not in self._stats]
+
+    def top(self, members: Dict[str, str], sort_by: str = "count", k: int = 10) -> List[Tuple[str, RankStats]]:
+        """Top k (user_id, stats) among members (user_id -> steam_id) by game count or playtime."""
+        if sort_by == "time":
+            key = lambda item: item[1].minutes
+        else:
+            key = lambda item: item[1].count
+        entries = [
+            (user_id, self._stats[steam_id]) for user_id, steam_id in members.items()
+            if steam_id in self._stats
+        ]
+        return heapq.nlargest(k, entries, key=key)
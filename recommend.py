@@ -0,0 +1,209 @@
+import asyncio
+import heapq
+import math
+from typing import Any, Collection, Dict, Iterable, List, Mapping, Optional, Sequence
+
+from .data_store import DataStore
+
+WEIGHTINGS = ("log", "linear", "binary")
+NORMALIZATIONS = ("cosine", "none")
+
+# Rows whose accumulated weight falls below this are treated as removed (float drift)
+_EPSILON = 1e-9
+
+
+def playtime_weight(minutes: int, weighting: str = "log") -> float:
+    """Weight of one game in a user's profile: log(1 + hours), hours, or 1."""
+    if weighting == "binary":
+        return 1.0
+    if weighting == "linear":
+        return minutes / 60.0
+    return math.log1p(minutes / 60.0)
+
+
+class RecommendEngine:
+    """
+    Item-based collaborative filtering for /steam推荐.
+
+    Every user with a known library has a sparse profile over their ``source_limit`` most
+    played games (appid -> weight); together these are the rows of a user x app matrix kept
+    as dictionaries. An item-item co-occurrence index (sum over users of w_a * w_b, plus the
+    squared norm of each item column) is maintained incrementally: when a library refreshes,
+    the user's old profile is subtracted and the new one added, O(source_limit^2) per update.
+    The index is shared by all groups; a group's matrix is just its members' rows, which
+    provide the candidates (games the target does not own). A candidate's score is the
+    target's profile times its similarity (cosine or raw co-occurrence) to each of the
+    target's games, so no library is fetched or scanned at query time.
+    """
+
+    def __init__(
+        self,
+        store: Optional[DataStore] = None,
+        logger=None,
+        source_limit: int = 40,
+        weighting: str = "log",
+        normalization: str = "cosine",
+    ):
+        self.store = store
+        self.logger = logger
+        self.source_limit = max(1, int(source_limit))
+        self.weighting = weighting if weighting in WEIGHTINGS else "log"
+        self.normalization = normalization if normalization in NORMALIZATIONS else "cosine"
+        # steam_id -> appid -> playtime minutes (the stored profile)
+        self._profiles: Dict[str, Dict[int, int]] = {}
+        # steam_id -> appid -> weight (the user x app matrix rows)
+        self._weights: Dict[str, Dict[int, float]] = {}
+        self._cooccurrence: Dict[int, Dict[int, float]] = {}
+        self._norms: Dict[int, float] = {}
+        self._names: Dict[int, str] = {}
+        self._background = set()
+
+    async def load(self):
+        if self.store is None:
+            return
+        try:
+            rows = await self.store.get_recommend_profiles()
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"读取推荐索引失败：{e}")
+            return
+        for steam_id, games in rows.items():
+            # Profiles refreshed while loading are newer than the stored ones
+            if steam_id in self._profiles:
+                continue
+            profile = {}
+            for appid, minutes, name in games:
+                profile[int(appid)] = int(minutes)
+                if name:
+                    self._names.setdefault(int(appid), name)
+            self._apply(steam_id, profile)
+
+    def update(self, steam_id: str, games: Sequence[Mapping[str, Any]]):
+        """Replace one user's profile from a freshly fetched library."""
+        steam_id = str(steam_id)
+        top = heapq.nlargest(
+            self.source_limit,
+            (g for g in games if g.get("appid") and g.get("playtime_forever", 0) > 0),
+            key=lambda g: g.get("playtime_forever", 0),
+        )
+        profile = {int(g["appid"]): int(g["playtime_forever"]) for g in top}
+        for g in top:
+            if g.get("name"):
+                self._names[int(g["appid"])] = g["name"]
+        if self._profiles.get(steam_id) == profile:
+            return
+        self._apply(steam_id, profile)
+        if self.store is not None:
+            rows = [[appid, minutes, self._names.get(appid, "")] for appid, minutes in profile.items()]
+            task = asyncio.ensure_future(self.store.put_recommend_profile(steam_id, rows))
+            self._background.add(task)
+            task.add_done_callback(self._on_persisted)
+
+    def _on_persisted(self, task: asyncio.Future):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() and self.logger:
+            self.logger.warning(f"写入推荐索引失败：{task.exception()}")
+
+    def _apply(self, steam_id: str, profile: Dict[int, int]):
+        old = self._weights.pop(steam_id, None)
+        if old:
+            self._accumulate(old, -1.0)
+        weights = {appid: playtime_weight(minutes, self.weighting) for appid, minutes in profile.items()}
+        weights = {appid: w for appid, w in weights.items() if w > 0}
+        self._profiles[steam_id] = profile
+        if weights:
+            self._weights[steam_id] = weights
+            self._accumulate(weights, 1.0)
+
+    def _accumulate(self, weights: Dict[int, float], sign: float):
+        items = list(weights.items())
+        for a, wa in items:
+            norm = self._norms.get(a, 0.0) + sign * wa * wa
+            if norm > _EPSILON:
+                self._norms[a] = norm
+            else:
+                self._norms.pop(a, None)
+            row = self._cooccurrence.setdefault(a, {})
+            for b, wb in items:
+                if b == a:
+                    continue
+                value = row.get(b, 0.0) + sign * wa * wb
+                if value > _EPSILON:
+                    row[b] = value
+                else:
+                    row.pop(b, None)
+            if not row:
+                del self._cooccurrence[a]
+
+    def similarity(self, a: int, b: int) -> float:
+        raw = self._cooccurrence.get(a, {}).get(b, 0.0)
+        if not raw or self.normalization == "none":
+            return raw
+        denominator = self._norms.get(a, 0.0) * self._norms.get(b, 0.0)
+        return raw / math.sqrt(denominator) if denominator > 0 else 0.0
+
+    def missing(self, steam_ids: Iterable[str]) -> List[str]:
+        return [sid for sid in steam_ids if str(sid) not in self._profiles]
+
+    def recommend(
+        self,
+        target_steam_id: str,
+        owned: Collection[int],
+        members: Iterable[str],
+        k: int = 6,
+        target_games: Optional[Sequence[Mapping[str, Any]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Top k games played by members that the target does not own, as dicts with appid,
+        name, score (similarity), minutes (members' total playtime) and owners (steam ids).
+        target_games (e.g. the target's library) is used when the target has no profile yet.
+        """
+        candidates: Dict[int, Dict[str, Any]] = {}
+        for steam_id in dict.fromkeys(members):
+            if steam_id == target_steam_id:
+                continue
+            weights = self._weights.get(steam_id, {})
+            for appid, minutes in self._profiles.get(steam_id, {}).items():
+                if appid in owned:
+                    continue
+                entry = candidates.get(appid)
+                if entry is None:
+                    entry = candidates[appid] = {
+                        "appid": appid,
+                        "name": self._names.get(appid, f"App {appid}"),
+                        "score": 0.0,
+                        "popularity": 0.0,
+                        "minutes": 0,
+                        "owners": [],
+                    }
+                entry["minutes"] += minutes
+                entry["popularity"] += weights.get(appid, 0.0)
+                entry["owners"].append(steam_id)
+        if not candidates:
+            return []
+
+        target = self._weights.get(target_steam_id)
+        if target is None and target_games:
+            top = heapq.nlargest(self.source_limit, target_games, key=lambda g: g.get("playtime_forever", 0))
+            target = {
+                int(g["appid"]): playtime_weight(g.get("playtime_forever", 0), self.weighting)
+                for g in top if g.get("appid") and g.get("playtime_forever", 0) > 0
+            }
+        # score(b) = sum_a w_a * raw(a, b) / sqrt(norm_a * norm_b); the 1 / sqrt(norm_b) factor
+        # is applied once per candidate and the inner loop only visits shared keys
+        cosine = self.normalization == "cosine"
+        scores: Dict[int, float] = {}
+        for a, wa in (target or {}).items():
+            row = self._cooccurrence.get(a)
+            if not row:
+                continue
+            coef = wa / math.sqrt(self._norms[a]) if cosine else wa
+            for b in row.keys() & candidates.keys():
+                scores[b] = scores.get(b, 0.0) + coef * row[b]
+        for b, score in scores.items():
+            candidates[b]["score"] = score / math.sqrt(self._norms[b]) if cosine else score
+
+        # Candidates unrelated to the target's games still rank by how much the group plays them
+        return heapq.nlargest(
+            k, candidates.values(), key=lambda e: (e["score"], e["popularity"], len(e["owners"]))
+        )
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .resilience import SingleFlight
+
+
+class RenderCache:
+    """
+    Disk cache of rendered images keyed by a hash of the final HTML and the render options.
+
+    Pages are rendered locally from pre-compiled templates, so the HTML already captures the
+    template and its data; identical commands within ``ttl`` seconds reuse the image instead of
+    another headless browser pass. Concurrent identical renders share one in-progress render.
+    Files live in ``cache_dir`` and are evicted least-recently-used beyond ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir: Path, ttl: float = 300, max_bytes: int = 128 * 1024 * 1024, logger=None):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = max(0.0, float(ttl))
+        self.max_bytes = max(0, int(max_bytes))
+        self.logger = logger
+        # key -> (path, created_at (wall clock), size), in LRU order
+        self._entries: "OrderedDict[str, Tuple[Path, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._inflight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def make_key(html: str, options: Optional[Dict[str, Any]] = None) -> str:
+        digest = hashlib.sha256(html.encode("utf-8"))
+        digest.update(json.dumps(options or {}, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _scan_dir(self) -> Tuple[List[Tuple[str, Path, float, int]], List[Path]]:
+        """Index surviving renders from a previous run and collect expired/partial files."""
+        entries, stale = [], []
+        if not self.cache_dir.is_dir():
+            return entries, stale
+        now = time.time()
+        for path in self.cache_dir.iterdir():
+            if not path.is_file():
+                continue
+            stat = path.stat()
+            if path.suffix == ".tmp" or stat.st_size == 0 or now - stat.st_mtime >= self.ttl:
+                stale.append(path)
+                continue
+            entries.append((path.stem, path, stat.st_mtime, stat.st_size))
+        entries.sort(key=lambda e: e[2])
+        return entries, stale
+
+    @staticmethod
+    def _unlink_all(paths: List[Path]):
+        for path in paths:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    async def start(self):
+        if not self.enabled:
+            return
+        try:
+            entries, stale = await asyncio.to_thread(self._scan_dir)
+            await asyncio.to_thread(self._unlink_all, stale)
+        except OSError as e:
+            if self.logger:
+                self.logger.warning(f"渲染缓存目录检查失败：{e}")
+            return
+        for key, path, created_at, size in entries:
+            if key not in self._entries:
+                self._entries[key] = (path, created_at, size)
+                self._bytes += size
+        await self._evict()
+
+    def _lookup(self, key: str) -> Optional[Path]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        path, created_at, size = entry
+        if time.time() - created_at >= self.ttl:
+            # The file is overwritten by the next render or removed by _evict()
+            return None
+        self._entries.move_to_end(key)
+        return path
+
+    def _drop(self, key: str) -> Optional[Path]:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._bytes -= entry[2]
+        return entry[0]
+
+    def _store_file(self, src: str, key: str) -> Tuple[Path, int]:
+        suffix = Path(src).suffix or ".jpg"
+        dest = self.cache_dir / f"{key}{suffix}"
+        tmp_path = dest.with_name(dest.name + ".tmp")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dest)
+        return dest, dest.stat().st_size
+
+    async def _evict(self):
+        """Delete expired renders and, beyond max_bytes, the least recently used ones."""
+        now = time.time()
+        expired = [key for key, (_, created_at, _) in self._entries.items() if now - created_at >= self.ttl]
+        victims = [self._drop(key) for key in expired]
+        while self.max_bytes and self._entries and self._bytes > self.max_bytes:
+            key = next(iter(self._entries))
+            victims.append(self._drop(key))
+        if victims:
+            await asyncio.to_thread(self._unlink_all, victims)
+
+    async def get_or_render(
+        self, html: str, options: Optional[Dict[str, Any]], render: Callable[[], Awaitable[str]]
+    ) -> str:
+        """
+        Return a cached image path for (html, options), otherwise run render() once for all
+        concurrent callers. render() must produce a local image file; anything else (e.g. a
+        URL) is returned as-is without caching.
+        """
+        if not self.enabled:
+            return await render()
+        key = self.make_key(html, options)
+        path = self._lookup(key)
+        if path is not None:
+            self.hits += 1
+            return str(path)
+        self.misses += 1
+
+        return await self._inflight.run(key, lambda: self._render_and_store(key, render))
+
+    async def _render_and_store(self, key: str, render: Callable[[], Awaitable[str]]) -> str:
+        result = await render()
+        if not result or not await asyncio.to_thread(os.path.isfile, result):
+            return result
+        if self.max_bytes and await asyncio.to_thread(os.path.getsize, result) > self.max_bytes:
+            return result
+        try:
+            path, size = await asyncio.to_thread(self._store_file, result, key)
+        except OSError as e:
+            if self.logger:
+                self.logger.warning(f"写入渲染缓存失败：{e}")
+            return result
+        self._drop(key)
+        self._entries[key] = (path, time.time(), size)
+        self._bytes += size
+        await self._evict()
+        return str(path)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,288 @@
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class TokenBucket:
+    """
+    Async token bucket shared by every Steam Web API call.
+    ``rate`` tokens are added per second up to ``capacity``; ``pause`` blocks all callers,
+    which is used when Steam answers 429 so the whole plugin backs off, not just one request.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = max(0.01, float(rate))
+        self.capacity = max(1.0, float(capacity if capacity is not None else self.rate * 5))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def available(self) -> float:
+        """Tokens currently available (0 while paused)."""
+        if time.monotonic() < self._paused_until:
+            return 0.0
+        self._refill()
+        return self._tokens
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + max(0.0, seconds))
+
+    async def acquire(self):
+        # The lock makes waiters queue in FIFO order instead of racing for each refill
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# Longest single wait between retries, whether from backoff or a server's Retry-After
+BACKOFF_CAP = 30.0
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = BACKOFF_CAP) -> float:
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value: Optional[str], cap: float = BACKOFF_CAP) -> Optional[float]:
+    """
+    Parse a Retry-After header given either as seconds or as an HTTP date, clamped to cap:
+    the delay pauses the shared rate limiter, so one bogus header must not stall every call.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(cap, float(value))
+    try:
+        return min(cap, max(0.0, parsedate_to_datetime(value).timestamp() - time.time()))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Per endpoint family circuit breaker (Web API, store, CDN).
+
+    After ``failure_threshold`` consecutive failures the circuit opens and calls fail fast.
+    Once ``recovery_timeout`` has passed a single probe is let through (half-open); its
+    outcome closes the circuit again or re-opens it for another timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recovery_timeout = max(0.0, float(recovery_timeout))
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.recovery_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def would_allow(self) -> bool:
+        """Whether allow() would let a call through now, without claiming the half-open probe."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self._opened_at >= self.recovery_timeout
+        return not self._probe_in_flight
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN:
+            self._open()
+            return
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self._open()
+
+    def release(self):
+        """Give up a half-open probe without an outcome (e.g. the caller was cancelled)."""
+        self._probe_in_flight = False
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+
+
+class SingleFlight:
+    """
+    Run factory() once per key at a time; concurrent callers await the same in-flight task.
+    The shared task is shielded so a cancelled caller does not cancel it for the others,
+    and its result or exception is delivered to every waiter.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+
+class Deadline:
+    """
+    Latency budget for one command. Awaitables that do not finish in time are abandoned and
+    replaced by a fallback (typically whatever is still in the cache). Shared single-flight
+    fetches are shielded, so an abandoned fetch keeps running and still warms the cache.
+
+    Work started through ``run`` / ``gather`` / ``as_completed`` sees the deadline as
+    ``current_deadline`` (tasks inherit it), so a retry loop deep in a fetch can give up
+    instead of sleeping past the point where its caller stops waiting.
+    """
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + max(0.0, float(seconds))
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining <= 0
+
+    def _start(self, aw) -> asyncio.Future:
+        token = current_deadline.set(self)
+        try:
+            return asyncio.ensure_future(aw)
+        finally:
+            current_deadline.reset(token)
+
+    @staticmethod
+    def _fallback(fallback, *args):
+        return fallback(*args) if callable(fallback) else fallback
+
+    async def run(self, aw, fallback=None):
+        """Await aw within the remaining budget, returning fallback (value or callable) on timeout."""
+        if self.expired:
+            if asyncio.iscoroutine(aw):
+                aw.close()
+            return self._fallback(fallback)
+        try:
+            return await asyncio.wait_for(self._start(aw), self.remaining)
+        except asyncio.TimeoutError:
+            return self._fallback(fallback)
+
+    async def gather(self, aws, fallback=None) -> list:
+        """
+        Like ``asyncio.gather(..., return_exceptions=True)`` bounded by the deadline.
+        Unfinished items are cancelled and replaced by ``fallback(index)``.
+        """
+        tasks = [self._start(aw) for aw in aws]
+        if not tasks:
+            return []
+        done, pending = await asyncio.wait(tasks, timeout=self.remaining)
+        for task in pending:
+            task.cancel()
+        results = []
+        for index, task in enumerate(tasks):
+            if task in done:
+                results.append(self._outcome(task))
+            else:
+                results.append(self._fallback(fallback, index))
+        return results
+
+    @staticmethod
+    def _outcome(task: asyncio.Future) -> Any:
+        if task.cancelled():
+            return asyncio.CancelledError()
+        return task.exception() or task.result()
+
+    async def as_completed(self, aws: Iterable, fallback=None, limit: int = 0) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        Yield ``(index, result)`` as awaitables finish, exceptions included as results.
+        At most ``limit`` (0 = unbounded) run at once and further awaitables are only started as
+        earlier ones complete, so memory stays bounded on large inputs. When the deadline
+        passes, unfinished and unstarted items are cancelled and yielded as ``fallback(index)``.
+        """
+        source = enumerate(aws)
+        pending = {}
+
+        def fill():
+            while not limit or len(pending) < limit:
+                item = next(source, None)
+                if item is None:
+                    return
+                index, aw = item
+                pending[self._start(aw)] = index
+
+        fill()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                for task in done:
+                    yield pending.pop(task), self._outcome(task)
+                fill()
+        finally:
+            for task in pending:
+                task.cancel()
+        leftover = sorted(pending.values())
+        for index, aw in source:
+            if asyncio.iscoroutine(aw):
+                aw.close()
+            leftover.append(index)
+        for index in leftover:
+            yield index, self._fallback(fallback, index)
+
+
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
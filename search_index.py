@@ -0,0 +1,223 @@
+import asyncio
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .data_store import DataStore
+from .library import Library
+from .resilience import SingleFlight
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def normalize(text: str) -> str:
+    """NFKC + casefold, keeping only letters and digits (drops spaces, punctuation, ™ / ®)."""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+def ngrams(norm: str) -> set:
+    """Character bigrams and trigrams; a single character is its own gram."""
+    if len(norm) < 2:
+        return {norm} if norm else set()
+    grams = {norm[i:i + 2] for i in range(len(norm) - 1)}
+    grams.update(norm[i:i + 3] for i in range(len(norm) - 2))
+    return grams
+
+
+def acronym(name: str) -> str:
+    """Initials of a Latin multi-word name, numbers kept whole: "Grand Theft Auto V" -> "gtav"."""
+    words = _WORD_RE.findall(unicodedata.normalize("NFKC", name or "").casefold())
+    if len(words) < 2 or not all(word.isascii() for word in words):
+        return ""
+    return "".join(word if word.isdigit() else word[0] for word in words)
+
+
+class SearchHit:
+    __slots__ = ("record", "kind", "score")
+
+    # Match kinds, strongest first
+    EXACT = "exact"
+    ALIAS = "alias"
+    PREFIX = "prefix"
+    APPID = "appid"
+    SUBSTRING = "substring"
+    FUZZY = "fuzzy"
+
+    # A name the user typed beats a coincidental appid ("2" -> "Counter-Strike 2", not app 2)
+    _TIERS = {EXACT: 6, ALIAS: 5, PREFIX: 4, APPID: 3, SUBSTRING: 2, FUZZY: 0}
+
+    def __init__(self, record: Mapping[str, Any], kind: str, score: float):
+        self.record = record
+        self.kind = kind
+        self.score = score
+
+    @property
+    def confident(self) -> bool:
+        """Anything but a fuzzy match is taken as the user's choice without asking."""
+        return self.kind != self.FUZZY
+
+    @property
+    def rank(self) -> Tuple[int, float, int]:
+        return (self._TIERS[self.kind], self.score, int(self.record.get("playtime_forever", 0) or 0))
+
+
+class SearchIndex:
+    """
+    Fuzzy name lookup over a fixed set of game records.
+
+    Names are normalized once and their character bigrams / trigrams go into postings lists,
+    so a query only touches the games sharing at least one gram with it instead of comparing
+    against every name. Exact names, appids and acronyms ("gtav", "cs2") are plain dictionary
+    lookups. Results are ranked exact > alias > prefix > appid > substring > fuzzy, then by
+    n-gram similarity and playtime.
+    """
+
+    MIN_APPID_DIGITS = 3
+
+    def __init__(self, records: Sequence[Mapping[str, Any]], aliases: Optional[Mapping[str, int]] = None):
+        self._records = tuple(records)
+        self._norms: List[str] = []
+        self._gram_counts: List[int] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._exact: Dict[str, List[int]] = {}
+        self._aliases: Dict[str, List[int]] = {}
+        self._by_appid: Dict[int, int] = {}
+
+        for pos, record in enumerate(self._records):
+            name = record.get("name") or ""
+            norm = normalize(name)
+            grams = ngrams(norm)
+            self._norms.append(norm)
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(pos)
+            if norm:
+                self._exact.setdefault(norm, []).append(pos)
+            short = acronym(name)
+            if short and short != norm:
+                self._aliases.setdefault(short, []).append(pos)
+            try:
+                self._by_appid[int(record.get("appid"))] = pos
+            except (TypeError, ValueError):
+                pass
+
+        for alias, appid in (aliases or {}).items():
+            pos = self._by_appid.get(int(appid))
+            norm = normalize(alias)
+            if pos is not None and norm:
+                self._aliases.setdefault(norm, []).append(pos)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def search(self, query: str, limit: int = 5, cutoff: float = 0.45) -> List[SearchHit]:
+        """Best matches for query; fuzzy matches below cutoff are dropped."""
+        norm = normalize(query)
+        if not norm or not self._records:
+            return []
+        hits: Dict[int, SearchHit] = {}
+
+        def add(pos: int, kind: str, score: float):
+            hit = SearchHit(self._records[pos], kind, score)
+            current = hits.get(pos)
+            if current is None or hit.rank > current.rank:
+                hits[pos] = hit
+
+        for pos in self._exact.get(norm, ()):
+            add(pos, SearchHit.EXACT, 1.0)
+        for pos in self._aliases.get(norm, ()):
+            add(pos, SearchHit.ALIAS, 1.0)
+        # Real appids have at least 3 digits; shorter numbers are game names ("Left 4 Dead")
+        if norm.isdigit() and len(norm) >= self.MIN_APPID_DIGITS and int(norm) in self._by_appid:
+            add(self._by_appid[int(norm)], SearchHit.APPID, 1.0)
+
+        query_grams = ngrams(norm)
+        candidates: Dict[int, int] = {}
+        if len(norm) < 2:
+            # A lone character (e.g. one CJK glyph) has no bigrams: scan for it instead
+            candidates = {pos: 1 for pos, name in enumerate(self._norms) if norm in name}
+        else:
+            for gram in query_grams:
+                for pos in self._postings.get(gram, ()):
+                    candidates[pos] = candidates.get(pos, 0) + 1
+
+        total = len(query_grams)
+        for pos, common in candidates.items():
+            name = self._norms[pos]
+            # Share of the query found in the name, tempered by Dice similarity so shorter,
+            # closer names win over long ones that merely contain the same grams
+            dice = 2.0 * common / (total + self._gram_counts[pos])
+            score = 0.7 * common / total + 0.3 * dice
+            if name.startswith(norm):
+                add(pos, SearchHit.PREFIX, score)
+            elif norm in name:
+                add(pos, SearchHit.SUBSTRING, score)
+            elif score >= cutoff:
+                add(pos, SearchHit.FUZZY, score)
+
+        ranked = sorted(hits.values(), key=lambda hit: hit.rank, reverse=True)
+        return ranked[:limit]
+
+
+class SearchIndexCache:
+    """
+    Search indexes for user libraries plus the shared app-name catalog.
+
+    A library's index is built on first search and reused while SteamAPI keeps serving the
+    same Library object; when the owned-games cache refreshes, a new Library is built and the
+    index with it. The catalog (every app name seen in any fetched library, from the
+    DataStore) is rebuilt off the event loop at most every ``catalog_ttl`` seconds, so typos
+    and games the user does not own still resolve to a name.
+    """
+
+    def __init__(
+        self,
+        store: Optional[DataStore] = None,
+        logger=None,
+        max_libraries: int = 64,
+        catalog_ttl: float = 600,
+    ):
+        self.store = store
+        self.logger = logger
+        self.max_libraries = max(1, int(max_libraries))
+        self.catalog_ttl = max(0.0, float(catalog_ttl))
+        # steam_id -> (library, index), in LRU order
+        self._libraries: "OrderedDict[str, Tuple[Library, SearchIndex]]" = OrderedDict()
+        self._catalog: Optional[SearchIndex] = None
+        self._catalog_built = 0.0
+        self._catalog_build = SingleFlight()
+
+    async def for_library(self, library: Library) -> SearchIndex:
+        entry = self._libraries.get(library.steam_id)
+        if entry is not None and entry[0] is library:
+            self._libraries.move_to_end(library.steam_id)
+            return entry[1]
+        # Indexing a few thousand names takes long enough to stall other commands
+        index = await asyncio.to_thread(SearchIndex, library.top())
+        self._libraries[library.steam_id] = (library, index)
+        self._libraries.move_to_end(library.steam_id)
+        while len(self._libraries) > self.max_libraries:
+            self._libraries.popitem(last=False)
+        return index
+
+    async def catalog(self) -> Optional[SearchIndex]:
+        if self.store is None:
+            return None
+        if self._catalog is not None and time.monotonic() - self._catalog_built < self.catalog_ttl:
+            return self._catalog
+        return await self._catalog_build.run("catalog", self._build_catalog)
+
+    async def _build_catalog(self) -> Optional[SearchIndex]:
+        try:
+            names = await self.store.get_app_names()
+            records = [{"appid": appid, "name": name} for appid, name in names.items()]
+            self._catalog = await asyncio.to_thread(SearchIndex, records)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"加载游戏名称目录失败：{e}")
+        # Also throttles retries after a failure; the previous catalog (if any) keeps serving
+        self._catalog_built = time.monotonic()
+        return self._catalog
@@ -1,217 +1,688 @@
 import aiohttp
 import time
 import asyncio
-from typing import Dict, List, Optional, Any
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Any, Sequence
+
+from .cache import TTLCache, freeze_record, freeze_records
+from .data_store import DataStore
+from .library import Library
+from .resilience import CircuitBreaker, SingleFlight, TokenBucket, backoff_delay, current_deadline, parse_retry_after
+
+
+# Cached records are shared read-only mappings; callers that annotate copy only what they display
+Record = Mapping[str, Any]
+Records = Sequence[Record]
+
+
+class SteamAPIError(Exception):
+    """
+    A Steam request that failed after retries (throttled, server error, network error, bad payload).
+    Distinguishes "could not fetch" from a genuinely empty result.
+    """
+
+    def __init__(self, endpoint: str, status: Optional[int] = None, message: str = "", circuit_open: bool = False):
+        self.endpoint = endpoint
+        self.status = status
+        self.message = message
+        self.circuit_open = circuit_open
+        super().__init__(f"{endpoint} 请求失败（状态码 {status}）：{message}" if status else f"{endpoint} 请求失败：{message}")
+
+    @property
+    def throttled(self) -> bool:
+        return self.status == 429
+
+    @property
+    def retryable(self) -> bool:
+        if self.circuit_open:
+            return False
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+class _IdBatcher:
+    """
+    Coalesce single Steam ID lookups issued within a short window into one multi-ID request.
+    fetch_many receives up to max_batch ids and returns a mapping of steam_id -> result.
+    """
+
+    def __init__(
+        self,
+        fetch_many: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+        max_batch: int = 100,
+        window: float = 0.05,
+    ):
+        self._fetch_many = fetch_many
+        self._max_batch = max_batch
+        self._window = window
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def load(self, steam_id: str) -> Optional[Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(steam_id, []).append(future)
+        if len(self._pending) >= self._max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        for start in range(0, len(items), self._max_batch):
+            task = asyncio.ensure_future(self._run(dict(items[start:start + self._max_batch])))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[str, List[asyncio.Future]]):
+        # Skip ids whose callers have all gone away
+        ids = [sid for sid, futures in batch.items() if any(not f.done() for f in futures)]
+        if not ids:
+            return
+        try:
+            results = await self._fetch_many(ids)
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for sid, futures in batch.items():
+            value = results.get(sid)
+            for future in futures:
+                if not future.done():
+                    future.set_result(value)
+
 
 class SteamAPI:
     BASE_URL = "http://api.steampowered.com"
 
-    def __init__(self, api_key: str, proxy: str = None, logger=None):
+    # Connection pool settings shared by Web API, store and CDN requests
+    POOL_LIMIT = 64
+    POOL_LIMIT_PER_HOST = 16
+    KEEPALIVE_TIMEOUT = 60
+    DNS_CACHE_TTL = 600
+    MAX_IDS_PER_REQUEST = 100
+    # Per-namespace TTLs (seconds); the namespace is the cache key prefix
+    DEFAULT_CACHE_TTLS = {
+        "summary": 60,
+        "bans": 1800,
+        "games": 600,
+        "recent": 300,
+        "stats": 600,
+        "schema": 6 * 3600,
+        "friends": 1800,
+    }
+    # How long past its TTL an entry may still be served while it is refreshed in the background
+    # (stale-while-revalidate); beyond that the caller blocks on a fresh fetch
+    DEFAULT_MAX_STALE = {
+        "summary": 240,
+        "bans": 6 * 3600,
+        "games": 3600,
+        "recent": 900,
+        "stats": 1800,
+        "friends": 6 * 3600,
+    }
+    CACHE_SWEEP_INTERVAL = 60
+
+    def __init__(
+        self,
+        api_key: str,
+        proxy: str = None,
+        logger=None,
+        connect_timeout: float = 10,
+        read_timeout: float = 30,
+        cache: Optional[TTLCache] = None,
+        store: Optional[DataStore] = None,
+        schema_revalidate_after: float = 7 * 86400,
+        requests_per_second: float = 4,
+        max_concurrency: int = 8,
+        max_retries: int = 3,
+        breaker_threshold: int = 5,
+        breaker_recovery: float = 30,
+    ):
         self.api_key = api_key
         self.proxy = proxy
         self.logger = logger
-        self._cache: Dict[str, Dict[str, Any]] = {}
-        self._cache_ttl = 300  # 5 minutes
-        self._cache_lock = asyncio.Lock()
-
-    async def _get_cache(self, key: str) -> Optional[Any]:
-        async with self._cache_lock:
-            if key in self._cache:
-                data = self._cache[key]
-                if time.time() - data["timestamp"] < self._cache_ttl:
-                    return data["value"]
-                del self._cache[key]
-            return None
+        # An empty TTLCache is falsy (__len__), so test for None explicitly
+        if cache is None:
+            cache = TTLCache(namespace_ttls=self.DEFAULT_CACHE_TTLS, namespace_max_stale=self.DEFAULT_MAX_STALE)
+        self._cache = cache
+        self._sweeper_task: Optional[asyncio.Task] = None
+        # Persistent store for schemas / app names, consulted before the network
+        self.store = store
+        self.schema_revalidate_after = schema_revalidate_after
+        self._background = set()
+        # Shared across every Web API method: global pace, concurrency cap and retry budget
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self._concurrency = asyncio.Semaphore(max(1, int(max_concurrency)))
+        self.max_retries = max(0, int(max_retries))
+        # One breaker per endpoint family so a CDN outage does not block Web API calls
+        self.breakers = {
+            family: CircuitBreaker(family, breaker_threshold, breaker_recovery)
+            for family in ("api", "store", "cdn")
+        }
+        self.stale_serves = 0
+        self.revalidations = 0
+        self.revalidation_failures = 0
+        self._revalidating = set()
+        # Called with (steam_id, games) whenever an owned-games list is fetched from Steam
+        self._owned_games_listeners: List[Callable[[str, Records], None]] = []
+        # cache_key -> in-flight fetch shared by concurrent callers (single-flight)
+        self._inflight = SingleFlight()
+        self._timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=connect_timeout,
+            sock_connect=connect_timeout,
+            sock_read=read_timeout,
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+        # GetPlayerSummaries / GetPlayerBans accept up to 100 comma separated ids
+        self._summary_batcher = _IdBatcher(self._fetch_summaries_batch, max_batch=self.MAX_IDS_PER_REQUEST)
+        self._bans_batcher = _IdBatcher(self._fetch_bans_batch, max_batch=self.MAX_IDS_PER_REQUEST)
 
-    async def _set_cache(self, key: str, value: Any):
-        async with self._cache_lock:
-            self._cache[key] = {
-                "timestamp": time.time(),
-                "value": value
-            }
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the shared, lazily created HTTP session.
+        The pool keeps connections alive across commands so we only pay the TCP/TLS handshake once per host.
+        """
+        if self._session is not None and not self._session.closed:
+            return self._session
+        async with self._session_lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self.POOL_LIMIT,
+                    limit_per_host=self.POOL_LIMIT_PER_HOST,
+                    keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+                    ttl_dns_cache=self.DNS_CACHE_TTL,
+                    use_dns_cache=True,
+                )
+                self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+            return self._session
+
+    async def close(self):
+        """Close the shared session and stop background work, called when the plugin is unloaded."""
+        if self._sweeper_task is not None:
+            self._sweeper_task.cancel()
+            self._sweeper_task = None
+        for task in list(self._background):
+            task.cancel()
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def _guarded(self, family: str, endpoint: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run one HTTP attempt behind the family's circuit breaker.
+        Network errors and 5xx responses (SteamAPIError with status >= 500) count as failures.
+        """
+        breaker = self.breakers[family]
+        if not breaker.allow():
+            raise SteamAPIError(endpoint, None, f"{family} 熔断中，暂停请求", circuit_open=True)
+        outcome_recorded = False
+        try:
+            result = await call()
+            breaker.record_success()
+            outcome_recorded = True
+            return result
+        except SteamAPIError as e:
+            if e.status is not None and e.status >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            outcome_recorded = True
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            breaker.record_failure()
+            outcome_recorded = True
+            raise
+        finally:
+            if not outcome_recorded:
+                breaker.release()
+
+    async def fetch_bytes(self, url: str) -> Optional[bytes]:
+        """
+        Download a binary resource (e.g. CDN cover) through the shared pool.
+        Returns None only when the resource does not exist (404 / 410); any other non-200
+        status (429, 403, 5xx) raises SteamAPIError, as does an open CDN circuit.
+        """
+        async def call():
+            session = await self.get_session()
+            async with session.get(url, proxy=self.proxy or None) as response:
+                if response.status in (404, 410):
+                    return None
+                if response.status != 200:
+                    raise SteamAPIError("cdn", response.status, url)
+                return await response.read()
+
+        return await self._guarded("cdn", "cdn", call)
+
+    def _get_cache_swr(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Optional[Any]:
+        """
+        Cache read with stale-while-revalidate: a stale entry is returned immediately and
+        factory() is started in the background under the key's single-flight, so concurrent
+        stale hits trigger one refresh.
+        """
+        value, stale = self._cache.lookup(key)
+        if value and stale:
+            self.stale_serves += 1
+            self._revalidate(key, factory)
+        return value
+
+    def _revalidate(self, key: str, factory: Callable[[], Awaitable[Any]]):
+        if key in self._inflight or key in self._revalidating:
+            return
+        self._revalidating.add(key)
+        self.revalidations += 1
+
+        async def refresh():
+            try:
+                await self._inflight.run(key, factory)
+            except Exception as e:
+                # The stale entry stays until its hard expiry, the next hit retries
+                self.revalidation_failures += 1
+                if self.logger:
+                    self.logger.debug(f"Steam API 后台刷新 {key} 失败：{e}")
+            finally:
+                self._revalidating.discard(key)
+
+        self._spawn(refresh())
+
+    def add_owned_games_listener(self, callback: Callable[[str, Records], None]):
+        """Register a callback for every owned-games refresh (e.g. to maintain derived indexes)."""
+        self._owned_games_listeners.append(callback)
+
+    def _notify_owned_games(self, steam_id: str, games: Records):
+        for callback in self._owned_games_listeners:
+            try:
+                callback(steam_id, games)
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"游戏库更新回调失败：{e}")
+
+    def is_fresh(self, key: str) -> bool:
+        """Whether key is cached and within its TTL (used by the prefetcher to skip warm data)."""
+        return key in self._cache
+
+    @property
+    def cache_stats(self) -> Dict[str, int]:
+        stats = dict(self._cache.stats)
+        stats.update(
+            stale_serves=self.stale_serves,
+            revalidations=self.revalidations,
+            revalidation_failures=self.revalidation_failures,
+        )
+        return stats
+
+    def _set_cache(self, key: str, value: Any):
+        self._cache.set(key, value)
+        self._ensure_sweeper()
+
+    def _ensure_sweeper(self):
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.ensure_future(self._sweep_loop())
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.CACHE_SWEEP_INTERVAL)
+            removed = self._cache.sweep()
+            if removed and self.logger:
+                self.logger.debug(f"Steam API 缓存清理过期条目 {removed} 个，当前状态：{self.cache_stats}")
+
+    def _spawn(self, coro: Awaitable[Any]) -> asyncio.Future:
+        """Run a fire-and-forget coroutine, keeping a reference and logging its failure."""
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+
+        def _done(t: asyncio.Future):
+            self._background.discard(t)
+            if not t.cancelled() and t.exception() and self.logger:
+                self.logger.warning(f"Steam API 后台任务失败：{t.exception()}")
+
+        task.add_done_callback(_done)
+        return task
+
+    async def _cached_fetch(
+        self, cache_key: str, fetch: Callable[[], Awaitable[Any]], force_refresh: bool = False
+    ) -> Any:
+        """
+        Return the cached value for cache_key, otherwise run fetch() under single-flight
+        and cache its (truthy) result. Stale values within the namespace's max staleness
+        are served at once and refreshed in the background; force_refresh always blocks.
+        """
+        async def load():
+            value = await fetch()
+            if value:
+                self._set_cache(cache_key, value)
+            return value
+
+        if not force_refresh:
+            cached = self._get_cache_swr(cache_key, load)
+            if cached:
+                return cached
+
+        return await self._inflight.run(cache_key, load)
 
     async def _request(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Call a Steam Web API endpoint under the shared rate limiter and concurrency cap.
+        429 / 5xx / network errors are retried with jittered exponential backoff (honoring
+        Retry-After, capped); anything still failing raises SteamAPIError, as does a retry
+        that would sleep past the calling command's deadline.
+        """
+        params = dict(params)
         params["key"] = self.api_key
         params["format"] = "json"
-        
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(f"{self.BASE_URL}/{endpoint}", params=params, proxy=self.proxy) as response:
-                    if response.status != 200:
-                        if self.logger:
-                            self.logger.error(f"Steam API 请求失败，状态码 {response.status}，内容：{await response.text()}")
-                        return {}
+        url = f"{self.BASE_URL}/{endpoint}"
+
+        retry_after: Optional[float] = None
+
+        async def call():
+            nonlocal retry_after
+            session = await self.get_session()
+            async with session.get(url, params=params, proxy=self.proxy or None) as response:
+                if response.status == 200:
                     try:
-                        return await response.json()
+                        return await response.json(content_type=None)
                     except Exception as e:
-                        if self.logger:
-                            self.logger.error(f"Steam API 返回内容解析失败：{e}")
-                        return {}
-            except Exception as e:
-                if self.logger:
-                    self.logger.error(f"Steam API 请求异常：{e}")
-                return {}
+                        raise SteamAPIError(endpoint, response.status, f"返回内容解析失败：{e}")
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                raise SteamAPIError(endpoint, response.status, (await response.text())[:200])
+
+        error: Optional[SteamAPIError] = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            await self.rate_limiter.acquire()
+            try:
+                async with self._concurrency:
+                    return await self._guarded("api", endpoint, call)
+            except SteamAPIError as e:
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = SteamAPIError(endpoint, None, str(e) or type(e).__name__)
+
+            if not error.retryable or attempt >= self.max_retries:
+                break
+            delay = retry_after if retry_after is not None else backoff_delay(attempt)
+            if error.throttled:
+                # Back off globally, every other request would be throttled as well
+                self.rate_limiter.pause(delay)
+            deadline = current_deadline.get()
+            if deadline is not None and delay > deadline.remaining:
+                # The caller would give up before the retry; fail now with the (throttled) error
+                break
+            if self.logger:
+                self.logger.warning(f"{error}，{delay:.1f} 秒后重试（第 {attempt + 1} 次）")
+            await asyncio.sleep(delay)
+
+        if self.logger and not error.circuit_open:
+            self.logger.error(f"Steam API 请求失败：{error}")
+        raise error
+
+    @staticmethod
+    def _split_ids(steam_ids: str | List[str]) -> List[str]:
+        if isinstance(steam_ids, str):
+            steam_ids = steam_ids.split(",")
+        ids = []
+        for sid in steam_ids:
+            sid = str(sid).strip()
+            if sid and sid not in ids:
+                ids.append(sid)
+        return ids
+
+    async def _fetch_summaries_batch(self, steam_ids: List[str]) -> Dict[str, Record]:
+        data = await self._request("ISteamUser/GetPlayerSummaries/v0002/", {"steamids": ",".join(steam_ids)})
+        players = data.get("response", {}).get("players", []) if data else []
+        result = {}
+        for player in players:
+            sid = str(player.get("steamid", ""))
+            if sid:
+                player = freeze_record(player)
+                result[sid] = player
+                self._set_cache(f"summary_{sid}", player)
+        return result
+
+    async def _fetch_bans_batch(self, steam_ids: List[str]) -> Dict[str, Record]:
+        data = await self._request("ISteamUser/GetPlayerBans/v1/", {"steamids": ",".join(steam_ids)})
+        result = {}
+        for player in data.get("players", []) if data else []:
+            sid = str(player.get("SteamId", ""))
+            if sid:
+                player = freeze_record(player)
+                result[sid] = player
+                self._set_cache(f"bans_{sid}", player)
+        return result
+
+    async def _load_by_ids(
+        self, prefix: str, batcher: _IdBatcher, steam_ids: List[str], force_refresh: bool = False
+    ) -> List[Record]:
+        """Resolve ids from the per-ID cache, batching every miss through the given batcher."""
+        found: Dict[str, Record] = {}
+        missing = []
+        for sid in steam_ids:
+            cached = None
+            if not force_refresh:
+                cached = self._get_cache_swr(f"{prefix}_{sid}", lambda sid=sid: batcher.load(sid))
+            if cached:
+                found[sid] = cached
+            else:
+                missing.append(sid)
+        if missing:
+            fetched = await asyncio.gather(
+                *(self._inflight.run(f"{prefix}_{sid}", lambda sid=sid: batcher.load(sid)) for sid in missing)
+            )
+            for sid, value in zip(missing, fetched):
+                if value:
+                    found[sid] = value
+        return [found[sid] for sid in steam_ids if sid in found]
 
     async def get_player_summaries(self, steam_ids: str, force_refresh: bool = False) -> Optional[Dict[str, Any]]:
         """
         Get player summaries for a list of Steam IDs (comma separated).
+        A single ID returns one player dict, multiple IDs return a list.
+        Concurrent lookups are coalesced into 100-ID GetPlayerSummaries calls.
         force_refresh: If True, bypass cache to get fresh data.
+        Summaries are small and callers annotate them (e.g. static avatars), so each caller
+        gets its own shallow dict copied from the read-only cached record.
         """
-        cache_key = f"summary_{steam_ids}"
-        if not force_refresh:
-            cached = await self._get_cache(cache_key)
-            if cached:
-                if isinstance(cached, dict):
-                    return dict(cached)
-                if isinstance(cached, list):
-                    return [dict(player) for player in cached]
-                return cached
+        ids = self._split_ids(steam_ids)
+        if not ids:
+            return None
+        players = await self._load_by_ids("summary", self._summary_batcher, ids, force_refresh)
+        if not players:
+            return None
+        if isinstance(steam_ids, str) and "," not in steam_ids:
+            return dict(players[0])
+        return [dict(p) for p in players]
 
-        data = await self._request("ISteamUser/GetPlayerSummaries/v0002/", {"steamids": steam_ids})
-        if "response" in data and "players" in data["response"]:
-            players = data["response"]["players"]
-            if players:
-                # We usually query for one player, so return the first one if it's a single ID query
-                result = players[0] if "," not in steam_ids else players
-                await self._set_cache(cache_key, result)
-                if isinstance(result, dict):
-                    return dict(result)
-                if isinstance(result, list):
-                    return [dict(player) for player in result]
-                return result
-        return None
-
-    async def get_owned_games(self, steam_id: str) -> List[Dict[str, Any]]:
-        """
-        Get owned games for a Steam ID.
-        """
-        cache_key = f"games_{steam_id}"
-        cached = await self._get_cache(cache_key)
-        if cached:
-            return [dict(g) for g in cached]
-
-        params = {
-            "steamid": steam_id,
-            "include_appinfo": 1,
-            "include_played_free_games": 1
-        }
-        data = await self._request("IPlayerService/GetOwnedGames/v0001/", params)
-        
-        if "response" in data and "games" in data["response"]:
-            games = [dict(g) for g in data["response"]["games"]]
-            # Sort by playtime_forever descending
-            games.sort(key=lambda x: x.get("playtime_forever", 0), reverse=True)
-            await self._set_cache(cache_key, games)
-            return [dict(g) for g in games]
-        return []
-
-    async def get_recently_played_games(self, steam_id: str) -> List[Dict[str, Any]]:
-        """
-        Get recently played games for a Steam ID.
-        """
-        cache_key = f"recent_{steam_id}"
-        cached = await self._get_cache(cache_key)
-        if cached:
-            return [dict(g) for g in cached]
-
-        params = {
-            "steamid": steam_id,
-            "count": 10
-        }
-        data = await self._request("IPlayerService/GetRecentlyPlayedGames/v0001/", params)
+    async def get_library(self, steam_id: str, force_refresh: bool = False) -> Library:
+        """Owned games as an indexed Library, built once per fetched list."""
+        return self._library_for(steam_id, await self.get_owned_games(steam_id, force_refresh))
+
+    def _library_for(self, steam_id: str, games: Records) -> Library:
+        key = f"library_{steam_id}"
+        library = self._cache.peek(key)
+        if library is not None and library.source is games:
+            return library
+        library = Library(games, steam_id)
+        ttl = self._cache.ttl_for(f"games_{steam_id}") + self._cache.max_stale_for(f"games_{steam_id}")
+        self._cache.set(key, library, ttl=ttl)
+        return library
 
-        if "response" in data and "games" in data["response"]:
-            games = [dict(g) for g in data["response"]["games"]]
-            await self._set_cache(cache_key, games)
-            return [dict(g) for g in games]
-        return []
+    async def get_owned_games(self, steam_id: str, force_refresh: bool = False) -> Records:
+        """
+        Get owned games for a Steam ID, sorted by playtime (desc).
+        Returns the cached tuple of read-only records itself; copy the games you annotate.
+        """
+        async def fetch():
+            params = {
+                "steamid": steam_id,
+                "include_appinfo": 1,
+                "include_played_free_games": 1
+            }
+            data = await self._request("IPlayerService/GetOwnedGames/v0001/", params)
+            if "response" in data and "games" in data["response"]:
+                # Sort by playtime_forever descending
+                games = freeze_records(sorted(
+                    data["response"]["games"], key=lambda x: x.get("playtime_forever", 0), reverse=True
+                ))
+                if self.store is not None:
+                    names = [(g.get("appid"), g.get("name")) for g in games]
+                    self._spawn(self.store.put_app_names(names))
+                self._notify_owned_games(steam_id, games)
+                return games
+            # Private profile or no games: still an authoritative answer for derived indexes
+            self._notify_owned_games(steam_id, ())
+            return ()
+
+        return await self._cached_fetch(f"games_{steam_id}", fetch, force_refresh)
+
+    async def get_recently_played_games(self, steam_id: str) -> Records:
+        """
+        Get recently played games for a Steam ID (shared read-only records).
+        """
+        async def fetch():
+            params = {
+                "steamid": steam_id,
+                "count": 10
+            }
+            data = await self._request("IPlayerService/GetRecentlyPlayedGames/v0001/", params)
+            if "response" in data and "games" in data["response"]:
+                return freeze_records(data["response"]["games"])
+            return ()
+
+        return await self._cached_fetch(f"recent_{steam_id}", fetch)
 
     async def get_user_stats_for_game(self, steam_id: str, app_id: int) -> Optional[Dict[str, Any]]:
         """
         Get user stats and achievements for a game.
         """
-        cache_key = f"stats_{steam_id}_{app_id}"
-        cached = await self._get_cache(cache_key)
-        if cached: return cached
+        async def fetch():
+            params = {"steamid": steam_id, "appid": app_id}
+            try:
+                data = await self._request("ISteamUserStats/GetUserStatsForGame/v0002/", params)
+            except SteamAPIError as e:
+                # 400: the app has no stats, 403: the profile's game details are private
+                if e.status in (400, 403):
+                    return None
+                raise
+            return data.get("playerstats")
 
-        params = {"steamid": steam_id, "appid": app_id}
-        data = await self._request("ISteamUserStats/GetUserStatsForGame/v0002/", params)
-        
-        if "playerstats" in data:
-            await self._set_cache(cache_key, data["playerstats"])
-            return data["playerstats"]
-        return None
+        return await self._cached_fetch(f"stats_{steam_id}_{app_id}", fetch)
+
+    async def _fetch_schema_remote(self, app_id: int) -> Optional[Dict[str, Any]]:
+        params = {"appid": app_id}
+        try:
+            data = await self._request("ISteamUserStats/GetSchemaForGame/v2/", params)
+        except SteamAPIError as e:
+            if e.status in (400, 403):
+                data = {"game": {}}
+            else:
+                raise
+        if "game" not in data:
+            return None
+        schema = data["game"]
+        if self.store is not None:
+            try:
+                # Persist empty schemas as well so apps without achievements are not refetched
+                await self.store.put_schema(app_id, schema)
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"写入 Schema 持久化缓存失败 {app_id}：{e}")
+        if schema:
+            self._set_cache(f"schema_{app_id}", schema)
+        return schema
 
     async def get_schema_for_game(self, app_id: int) -> Optional[Dict[str, Any]]:
         """
         Get game schema (achievement names, icons).
+        Lookup order: memory cache -> persistent store -> Steam. Stored schemas older than
+        schema_revalidate_after are still served, and refreshed in the background.
         """
-        cache_key = f"schema_{app_id}"
-        cached = await self._get_cache(cache_key)
-        if cached: return cached
+        async def fetch():
+            if self.store is not None:
+                try:
+                    stored = await self.store.get_schema(app_id)
+                except Exception as e:
+                    stored = None
+                    if self.logger:
+                        self.logger.warning(f"读取 Schema 持久化缓存失败 {app_id}：{e}")
+                if stored is not None:
+                    schema, fetched_at = stored
+                    if time.time() - fetched_at > self.schema_revalidate_after:
+                        self._spawn(self._inflight.run(
+                            f"schema_revalidate_{app_id}", lambda: self._fetch_schema_remote(app_id)
+                        ))
+                    return schema
+            return await self._fetch_schema_remote(app_id)
 
-        params = {"appid": app_id}
-        data = await self._request("ISteamUserStats/GetSchemaForGame/v2/", params)
-        
-        if "game" in data:
-            await self._set_cache(cache_key, data["game"])
-            return data["game"]
-        return None
-
-    async def get_player_bans(self, steam_ids: str | List[str]) -> Optional[List[Dict[str, Any]]]:
-        """
-        获取 VAC / Game / Community Ban 信息
-        """
-        if isinstance(steam_ids, list):
-            joined = ",".join(steam_ids)
-        else:
-            joined = steam_ids
-        cache_key = f"bans_{joined}"
-        cached = await self._get_cache(cache_key)
-        if cached:
-            return [dict(p) for p in cached]
-
-        data = await self._request("ISteamUser/GetPlayerBans/v1/", {"steamids": joined})
-        if "players" in data:
-            await self._set_cache(cache_key, data["players"])
-            return [dict(p) for p in data["players"]]
-        return None
+        return await self._cached_fetch(f"schema_{app_id}", fetch)
+
+    def peek_owned_games(self, steam_id: str) -> Optional[Records]:
+        """Last known owned-games list (even if expired), used when a command runs out of time."""
+        return self._cache.peek(f"games_{steam_id}") or None
+
+    def peek_library(self, steam_id: str) -> Optional[Library]:
+        cached = self._cache.peek(f"games_{steam_id}")
+        return self._library_for(steam_id, cached) if cached else None
+
+    def peek_player_summary(self, steam_id: str) -> Optional[Dict[str, Any]]:
+        cached = self._cache.peek(f"summary_{steam_id}")
+        return dict(cached) if cached else None
+
+    async def get_player_bans(self, steam_ids: str | List[str]) -> Optional[List[Record]]:
+        """
+        获取 VAC / Game / Community Ban 信息（同一时间窗口内的查询会合并为一次请求）
+        """
+        ids = self._split_ids(steam_ids)
+        if not ids:
+            return None
+        players = await self._load_by_ids("bans", self._bans_batcher, ids)
+        return players or None
 
     async def get_friend_list(self, steam_id: str) -> List[str]:
         """
         获取好友列表（仅限 relationship=friend）
         """
-        cache_key = f"friends_{steam_id}"
-        cached = await self._get_cache(cache_key)
-        if cached:
-            return list(cached)
+        async def fetch():
+            try:
+                data = await self._request(
+                    "ISteamUser/GetFriendList/v0001/",
+                    {"steamid": steam_id, "relationship": "friend"},
+                )
+            except SteamAPIError as e:
+                # 401: the friend list is private
+                if e.status in (401, 403):
+                    return []
+                raise
+            if "friendslist" in data and "friends" in data["friendslist"]:
+                return [f.get("steamid") for f in data["friendslist"]["friends"] if f.get("steamid")]
+            return []
 
-        data = await self._request(
-            "ISteamUser/GetFriendList/v0001/",
-            {"steamid": steam_id, "relationship": "friend"},
-        )
-        if "friendslist" in data and "friends" in data["friendslist"]:
-            friends = [f.get("steamid") for f in data["friendslist"]["friends"] if f.get("steamid")]
-            await self._set_cache(cache_key, friends)
-            return list(friends)
-        return []
+        friends = await self._cached_fetch(f"friends_{steam_id}", fetch)
+        return list(friends)
 
     async def _request_store_json(self, url: str) -> Dict[str, Any]:
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, proxy=self.proxy, headers={"Accept": "application/json"}) as response:
-                    if response.status != 200:
-                        if self.logger:
-                            self.logger.error(f"Steam 商店接口请求失败，状态码 {response.status}")
-                        return {}
-                    try:
-                        return await response.json(content_type=None)
-                    except Exception as e:
-                        if self.logger:
-                            self.logger.error(f"Steam 商店接口返回内容解析失败：{e}")
-                        return {}
-            except Exception as e:
-                if self.logger:
-                    self.logger.error(f"Steam 商店接口请求异常：{e}")
-                return {}
+        async def call():
+            session = await self.get_session()
+            async with session.get(url, proxy=self.proxy or None, headers={"Accept": "application/json"}) as response:
+                if response.status != 200:
+                    raise SteamAPIError("store", response.status, url)
+                try:
+                    return await response.json(content_type=None)
+                except Exception as e:
+                    if self.logger:
+                        self.logger.error(f"Steam 商店接口返回内容解析失败：{e}")
+                    return {}
 
+        try:
+            return await self._guarded("store", "store", call)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Steam 商店接口请求异常：{e}")
+            return {}
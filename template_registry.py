@@ -0,0 +1,91 @@
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from jinja2 import Environment, Template, TemplateSyntaxError
+
+# Template handed to html_render: the page is rendered locally, the renderer only inlines it
+PASSTHROUGH_TEMPLATE = "{{ html | safe }}"
+
+
+class TemplateRegistry:
+    """
+    Pre-compiled Jinja templates from the plugin's ``templates/`` directory.
+
+    Every ``*.html`` file is read and compiled once by ``load()`` (run off the event loop at
+    startup). Afterwards a template is only re-read when its mtime changes, and the mtime
+    itself is checked at most every ``check_interval`` seconds, so a render costs neither
+    disk I/O nor parsing. Required templates are validated at load time.
+    """
+
+    def __init__(self, templates_dir: Path, required: Iterable[str] = (), logger=None, check_interval: float = 2.0):
+        self.templates_dir = Path(templates_dir)
+        self.required = tuple(required)
+        self.logger = logger
+        self.check_interval = max(0.0, float(check_interval))
+        # Matches the renderer's defaults: templates insert pre-built HTML/URLs without escaping
+        self._env = Environment(autoescape=False)
+        # name -> (compiled template, mtime, last stat time)
+        self._templates: Dict[str, Tuple[Template, float, float]] = {}
+        self.missing: List[str] = []
+        self._loaded = False
+
+    def load(self) -> List[str]:
+        """Compile every template in the directory; returns the required templates that are unusable."""
+        self._templates.clear()
+        if self.templates_dir.is_dir():
+            for path in sorted(self.templates_dir.glob("*.html")):
+                self._compile(path.name)
+        self._loaded = True
+        self.missing = [name for name in self.required if name not in self._templates]
+        if self.missing and self.logger:
+            self.logger.error(f"Steam 插件模板缺失或无法解析：{', '.join(self.missing)}，相关指令将不可用。")
+        return self.missing
+
+    def _compile(self, name: str) -> Optional[Template]:
+        path = self.templates_dir / name
+        try:
+            mtime = path.stat().st_mtime
+            template = self._env.from_string(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self._templates.pop(name, None)
+            return None
+        except (OSError, UnicodeDecodeError, TemplateSyntaxError) as e:
+            if self.logger:
+                self.logger.error(f"加载模板 {name} 失败：{e}")
+            # Keep serving the previous version if there is one
+            cached = self._templates.get(name)
+            return cached[0] if cached else None
+        self._templates[name] = (template, mtime, time.monotonic())
+        return template
+
+    def get(self, name: str) -> Optional[Template]:
+        cached = self._templates.get(name)
+        if cached is None:
+            return None
+        template, mtime, checked_at = cached
+        now = time.monotonic()
+        if now - checked_at < self.check_interval:
+            return template
+        try:
+            current = (self.templates_dir / name).stat().st_mtime
+        except OSError:
+            current = mtime
+        if current != mtime:
+            if self.logger:
+                self.logger.info(f"模板 {name} 已修改，重新加载。")
+            return self._compile(name)
+        self._templates[name] = (template, mtime, now)
+        return template
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def render(self, name: str, data: Dict[str, Any]) -> Optional[str]:
+        """Render a template to HTML, or None when it is not available."""
+        if not self._loaded:
+            self.load()
+        template = self.get(name)
+        if template is None:
+            return None
+        return template.render(**data)